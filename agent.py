@@ -3,12 +3,14 @@ from collections import OrderedDict
 from dataclasses import dataclass, field
 from datetime import datetime
 import json
+import threading
+import time
 from typing import Any, Awaitable, Coroutine, Optional, Dict, TypedDict
 import uuid
 import models
 
-from python.helpers import extract_tools, rate_limiter, files, errors, history, tokens
-from python.helpers import dirty_json
+from python.helpers import extract_tools, rate_limiter, files, errors, history, tokens, prompts, sidebar_index
+from python.helpers import dirty_json, dotenv
 from python.helpers.print_style import PrintStyle
 from langchain_core.prompts import (
     ChatPromptTemplate,
@@ -17,7 +19,7 @@ from langchain_core.messages import HumanMessage, SystemMessage, AIMessage, Base
 
 import python.helpers.log as Log
 from python.helpers.dirty_json import DirtyJson
-from python.helpers.defer import DeferredTask
+from python.helpers.defer import DeferredTask, EventLoopPool
 from typing import Callable
 from python.helpers.localization import Localization
 
@@ -26,6 +28,8 @@ class AgentContext:
 
     _contexts: dict[str, "AgentContext"] = {}
     _counter: int = 0
+    # loads a context saved to disk that is not in memory, set by persist_chat
+    _loader: Callable[[str], "AgentContext | None"] | None = None
 
     def __init__(
         self,
@@ -37,6 +41,7 @@ class AgentContext:
         paused: bool = False,
         streaming_agent: "Agent|None" = None,
         created_at: datetime | None = None,
+        no: int | None = None,
     ):
         # build context
         self.id = id or str(uuid.uuid4())
@@ -44,20 +49,39 @@ class AgentContext:
         self.config = config
         self.log = log or Log.Log()
         self.agent0 = agent0 or Agent(0, self.config, self)
-        self.paused = paused
+        self._pause_lock = threading.Lock()
+        self._pause_waiters: list[tuple[asyncio.AbstractEventLoop, asyncio.Future]] = []
+        self._paused = paused
         self.streaming_agent = streaming_agent
         self.task: DeferredTask | None = None
         self.created_at = created_at or datetime.now()
-        AgentContext._counter += 1
-        self.no = AgentContext._counter
+        if no is None:
+            AgentContext._counter += 1
+            no = AgentContext._counter
+        self.no = no
+        self.last_used = time.time()  # unused contexts are unloaded first
+        # tasks do not start while the context is saved and unloaded, messages then go to the loaded copy
+        self.unload_lock = threading.RLock()
+        self.unloaded = False
 
         existing = self._contexts.get(self.id, None)
         if existing:
             AgentContext.remove(self.id)
         self._contexts[self.id] = self
+        sidebar_index.mark_context(self.id)
 
     @staticmethod
     def get(id: str):
+        context = AgentContext._contexts.get(id, None)
+        if context is None and id and AgentContext._loader:
+            context = AgentContext._loader(id)
+        if context:
+            context.touch()
+        return context
+
+    @staticmethod
+    def get_loaded(id: str):
+        # only contexts in memory, does not load saved ones
         return AgentContext._contexts.get(id, None)
 
     @staticmethod
@@ -71,8 +95,49 @@ class AgentContext:
         context = AgentContext._contexts.pop(id, None)
         if context and context.task:
             context.task.kill()
+        if context:
+            AgentContext.get_loop_pool().release(id)
+        sidebar_index.mark_context(id)
         return context
 
+    @staticmethod
+    def get_loop_pool() -> EventLoopPool:
+        # contexts run on several event loop threads, a blocking call only stalls the contexts sharing its loop
+        size = int(dotenv.get_dotenv_value("AGENT_LOOP_THREADS", 0) or 4)
+        return EventLoopPool.get(AgentContext.__name__, size)
+
+    def touch(self):
+        self.last_used = time.time()
+
+    @property
+    def paused(self) -> bool:
+        return self._paused
+
+    @paused.setter
+    def paused(self, paused: bool):
+        with self._pause_lock:
+            self._paused = paused
+            if paused:
+                return
+            waiters, self._pause_waiters = self._pause_waiters, []
+        # agents wait on their own loops, pause is set from request threads
+        for loop, future in waiters:
+            try:
+                loop.call_soon_threadsafe(_resolve, future)
+            except RuntimeError:
+                pass  # loop closed, nothing waits there anymore
+
+    async def wait_if_paused(self):
+        """Return once the context is not paused, wakes up as soon as it is resumed."""
+        while self._paused:
+            loop = asyncio.get_running_loop()
+            future = loop.create_future()
+            with self._pause_lock:
+                if not self._paused:
+                    return
+                self._pause_waiters.append((loop, future))
+            await future
+
     def serialize(self):
         return {
             "id": self.id,
@@ -83,7 +148,7 @@ class AgentContext:
             ),
             "no": self.no,
             "log_guid": self.log.guid,
-            "log_version": len(self.log.updates),
+            "log_version": self.log.version,
             "log_length": len(self.log.logs),
             "paused": self.paused,
         }
@@ -98,11 +163,18 @@ class AgentContext:
     def reset(self):
         self.kill_process()
         self.log.reset()
+        sidebar_index.mark_context(self.id)
         self.agent0 = Agent(0, self.config, self)
         self.streaming_agent = None
         self.paused = False
 
     def nudge(self):
+        with self.unload_lock:
+            if not self.unloaded:
+                return self._nudge()
+        return AgentContext._get_reloaded(self.id).nudge()
+
+    def _nudge(self):
         self.kill_process()
         self.paused = False
         if self.streaming_agent:
@@ -114,6 +186,19 @@ class AgentContext:
         return self.task
 
     def communicate(self, msg: "UserMessage", broadcast_level: int = 1):
+        with self.unload_lock:
+            if not self.unloaded:
+                return self._communicate(msg, broadcast_level)
+        return AgentContext._get_reloaded(self.id).communicate(msg, broadcast_level)
+
+    @staticmethod
+    def _get_reloaded(id: str) -> "AgentContext":
+        context = AgentContext.get(id)
+        if not context:
+            raise Exception(f"Chat {id} was unloaded and could not be loaded again")
+        return context
+
+    def _communicate(self, msg: "UserMessage", broadcast_level: int):
         self.paused = False  # unpause if paused
 
         if self.streaming_agent:
@@ -140,7 +225,7 @@ class AgentContext:
     ):
         if not self.task:
             self.task = DeferredTask(
-                thread_name=self.__class__.__name__,
+                thread_name=AgentContext.get_loop_pool().get_thread_name(self.id),
             )
         self.task.start_task(func, *args, **kwargs)
         return self.task
@@ -164,6 +249,11 @@ class AgentContext:
             agent.handle_critical_exception(e)
 
 
+def _resolve(future: asyncio.Future):
+    if not future.done():
+        future.set_result(None)
+
+
 @dataclass
 class ModelConfig:
     provider: models.ModelProvider
@@ -202,6 +292,7 @@ class AgentConfig:
     code_exec_ssh_port: int = 55022
     code_exec_ssh_user: str = "root"
     code_exec_ssh_pass: str = ""
+    code_exec_pool_size: int = 0  # connected shells kept ready per backend and event loop
     additional: Dict[str, Any] = field(default_factory=dict)
 
 
@@ -453,9 +544,7 @@ class Agent:
         ):  # if agent has custom folder, use it and use default as backup
             prompt_dir = files.get_abs_path("prompts", self.config.prompts_subdir)
             backup_dir.append(files.get_abs_path("prompts/default"))
-        prompt = files.parse_file(
-            files.get_abs_path(prompt_dir, file), _backup_dirs=backup_dir, **kwargs
-        )
+        prompt = prompts.parse_prompt(prompt_dir, backup_dir, file, **kwargs)
         return prompt
 
     def read_prompt(self, file: str, **kwargs) -> str:
@@ -466,10 +555,7 @@ class Agent:
         ):  # if agent has custom folder, use it and use default as backup
             prompt_dir = files.get_abs_path("prompts", self.config.prompts_subdir)
             backup_dir.append(files.get_abs_path("prompts/default"))
-        prompt = files.read_file(
-            files.get_abs_path(prompt_dir, file), _backup_dirs=backup_dir, **kwargs
-        )
-        prompt = files.remove_code_fences(prompt)
+        prompt = prompts.read_prompt(prompt_dir, backup_dir, file, **kwargs)
         return prompt
 
     def get_data(self, field: str):
@@ -548,8 +634,14 @@ class Agent:
         )
 
     def get_embedding_model(self):
-        return models.get_model(
-            models.ModelType.EMBEDDING,
+        return models.get_embedding_model(
+            self.config.embeddings_model.provider,
+            self.config.embeddings_model.name,
+            **self.config.embeddings_model.kwargs,
+        )
+
+    def get_embedding_dimension(self):
+        return models.get_embedding_dimension(
             self.config.embeddings_model.provider,
             self.config.embeddings_model.name,
             **self.config.embeddings_model.kwargs,
@@ -646,8 +738,9 @@ class Agent:
         return limiter
 
     async def handle_intervention(self, progress: str = ""):
-        while self.context.paused:
-            await asyncio.sleep(0.1)  # wait if paused
+        # called for every streamed chunk, two attribute reads when not paused and no message waits
+        if self.context.paused:
+            await self.context.wait_if_paused()
         if (
             self.intervention
         ):  # if there is an intervention message, but not yet processed
@@ -660,8 +753,7 @@ class Agent:
             raise InterventionException(msg)
 
     async def wait_if_paused(self):
-        while self.context.paused:
-            await asyncio.sleep(0.1)
+        await self.context.wait_if_paused()
 
     async def process_tools(self, msg: str):
         # search for tool usage requests in agent message
@@ -54,6 +54,7 @@ def initialize():
         memory_subdir=current_settings["agent_memory_subdir"],
         knowledge_subdirs=["default", current_settings["agent_knowledge_subdir"]],
         code_exec_docker_enabled=False,
+        code_exec_pool_size=current_settings["code_exec_pool_size"],
         # code_exec_docker_name = "A0-dev",
         # code_exec_docker_image = "frdel/agent-zero-run:development",
         # code_exec_docker_ports = { "22/tcp": 55022, "80/tcp": 55080 }
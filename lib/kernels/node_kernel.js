@@ -0,0 +1,136 @@
+// Node.js kernel of code_execution_tool, started with node -e and driven by python/helpers/kernel.py
+// Messages are base64 encoded json on their own lines, host to kernel prefixed @@A0I+ (more follows) or
+// @@A0I. (last part), kernel to host prefixed @@A0K>. Other lines on stdout are raw output of the code.
+
+const vm = require('vm');
+const path = require('path');
+const readline = require('readline');
+
+const IN_PREFIX = '@@A0I';
+const OUT_PREFIX = '@@A0K>';
+
+const write = process.stdout.write.bind(process.stdout);
+
+function send(message) {
+  write(OUT_PREFIX + Buffer.from(JSON.stringify(message)).toString('base64') + '\n');
+}
+
+// output of the code is sent in output messages
+process.stdout.write = (chunk, encoding, callback) => {
+  send({ type: 'output', stream: 'stdout', text: chunk.toString() });
+  if (typeof encoding === 'function') encoding();
+  else if (callback) callback();
+  return true;
+};
+process.stderr.write = (chunk, encoding, callback) => {
+  send({ type: 'output', stream: 'stderr', text: chunk.toString() });
+  if (typeof encoding === 'function') encoding();
+  else if (callback) callback();
+  return true;
+};
+// the output is read by the agent, not a terminal
+const console = new (require('console').Console)({
+  stdout: process.stdout,
+  stderr: process.stderr,
+  colorMode: false,
+});
+global.console = console;
+
+// Enhance `require` to search CWD first, then globally
+function customRequire(moduleName) {
+  try {
+    const cwdPath = require.resolve(moduleName, { paths: [path.join(process.cwd(), 'node_modules')] });
+    return require(cwdPath);
+  } catch (cwdErr) {
+    try {
+      return require(moduleName);
+    } catch (globalErr) {
+      console.error(`Cannot find module: ${moduleName}`);
+      throw globalErr;
+    }
+  }
+}
+
+// one context for all cells
+const context = vm.createContext({
+  ...global,
+  require: customRequire,
+  __filename: path.join(process.cwd(), 'eval.js'),
+  __dirname: process.cwd(),
+  module: { exports: {} },
+  exports: module.exports,
+  console: console,
+  process: process,
+  Buffer: Buffer,
+  setTimeout: setTimeout,
+  setInterval: setInterval,
+  setImmediate: setImmediate,
+  clearTimeout: clearTimeout,
+  clearInterval: clearInterval,
+  clearImmediate: clearImmediate,
+});
+
+let running = null; // cell being executed, finished by its result or an interrupt
+let cellNo = 0;
+
+function finish(status, error) {
+  if (!running) return;
+  send({ type: 'done', id: running.id, status: status, error: error || '' });
+  running = null;
+}
+
+// an interrupt while awaiting the cell returns control, the awaited work is left behind
+process.on('SIGINT', () => finish('interrupted', 'SIGINT'));
+// process.exit() in a cell ends the interpreter, the host starts a new one for the next cell
+process.on('exit', (code) => finish('exit', String(code)));
+
+async function execute(message) {
+  cellNo += 1;
+  running = { id: message.id };
+  const cell = running;
+  const options = { filename: `cell-${cellNo}.js`, breakOnSigint: true };
+  try {
+    // run as a script, so declarations stay in the context for the next cells
+    let result;
+    try {
+      result = vm.runInContext(message.code, context, options);
+    } catch (error) {
+      if (!(error && error.name === 'SyntaxError' && /await/.test(error.message))) throw error;
+      // top level await needs an async function, its declarations are local to the cell
+      // and its value is what it returns
+      result = vm.runInContext(`(async () => {\n${message.code}\n})()`, context, options);
+    }
+    if (result && typeof result.then === 'function') result = await result;
+    if (cell !== running) return;
+    if (result !== undefined) console.log(`Out[${cellNo}]:`, result);
+    finish('ok');
+  } catch (error) {
+    if (cell !== running) return;
+    if (error && error.code === 'ERR_SCRIPT_EXECUTION_INTERRUPTED') {
+      finish('interrupted', 'SIGINT');
+      return;
+    }
+    // frames of the kernel and node internals are left out
+    const stack = String((error && error.stack) || error)
+      .split('\n')
+      .filter((line) => !/\(node:|\[eval\]|at node:/.test(line))
+      .join('\n');
+    console.error(stack);
+    finish('error', String(error && error.message || error));
+  }
+}
+
+let parts = [];
+const input = readline.createInterface({ input: process.stdin, terminal: false });
+input.on('line', (line) => {
+  line = line.trim();
+  if (!line.startsWith(IN_PREFIX)) return;
+  parts.push(line.slice(IN_PREFIX.length + 1));
+  if (line[IN_PREFIX.length] === '+') return;
+  const message = JSON.parse(Buffer.from(parts.join(''), 'base64').toString());
+  parts = [];
+  if (message.type === 'execute') execute(message);
+});
+input.on('close', () => process.exit(0));
+
+send({ type: 'ready', pid: process.pid });
@@ -0,0 +1,146 @@
+# Python kernel of code_execution_tool, started with python3 -u -c and driven by python/helpers/kernel.py
+# Messages are base64 encoded json on their own lines, host to kernel prefixed @@A0I+ (more follows) or
+# @@A0I. (last part), kernel to host prefixed @@A0K>. Other lines on stdout are raw output of the code.
+
+import ast
+import base64
+import json
+import linecache
+import os
+import signal
+import sys
+import threading
+import time
+import traceback
+
+IN_PREFIX = "@@A0I"
+OUT_PREFIX = "@@A0K>"
+FLUSH_INTERVAL = 0.05  # seconds between output messages while code prints
+
+_stdout = sys.__stdout__
+_send_lock = threading.Lock()  # output is also sent from flush timers
+
+
+def send(message):
+    data = base64.b64encode(json.dumps(message).encode()).decode()
+    with _send_lock:
+        _stdout.write(OUT_PREFIX + data + "\n")
+        _stdout.flush()
+
+
+class Output:
+    # stdout and stderr of the code, sent in output messages
+    def __init__(self, stream):
+        self.stream = stream
+        self.buffer = ""
+        self.last_flush = 0.0
+        self.lock = threading.RLock()
+        self.timer = None
+
+    def write(self, text):
+        with self.lock:
+            self.buffer += text
+            if "\n" in text and time.time() - self.last_flush >= FLUSH_INTERVAL:
+                self.flush()
+            elif self.buffer and not self.timer:
+                # what is held back is sent even if the code prints nothing more
+                self.timer = threading.Timer(FLUSH_INTERVAL, self.flush)
+                self.timer.daemon = True
+                self.timer.start()
+        return len(text)
+
+    def flush(self):
+        with self.lock:
+            if self.timer:
+                self.timer.cancel()
+                self.timer = None
+            if self.buffer:
+                send({"type": "output", "stream": self.stream, "text": self.buffer})
+                self.buffer = ""
+            self.last_flush = time.time()
+
+    def isatty(self):
+        return False
+
+    @property
+    def encoding(self):
+        return "utf-8"
+
+
+def run(code, namespace, cell):
+    # source of the cell for tracebacks
+    linecache.cache[f"<cell-{cell}>"] = (len(code), None, code.splitlines(True), f"<cell-{cell}>")
+    tree = ast.parse(code, f"<cell-{cell}>")
+    # the value of a final expression is shown, as in an interactive shell
+    last = tree.body.pop() if tree.body and isinstance(tree.body[-1], ast.Expr) else None
+    exec(compile(tree, f"<cell-{cell}>", "exec"), namespace)
+    if last:
+        value = eval(compile(ast.Expression(last.value), f"<cell-{cell}>", "eval"), namespace)
+        if value is not None:
+            print(f"Out[{cell}]: {value!r}")
+
+
+def main():
+    if sys.stdin.isatty():
+        import termios
+        attrs = termios.tcgetattr(0)
+        attrs[3] &= ~termios.ECHO  # input lines are not echoed back to the host
+        termios.tcsetattr(0, termios.TCSANOW, attrs)
+    signal.signal(signal.SIGINT, signal.default_int_handler)
+
+    namespace = {"__name__": "__main__", "__builtins__": __builtins__}
+    stdout, stderr = Output("stdout"), Output("stderr")
+    sys.stdout, sys.stderr = stdout, stderr
+    send({"type": "ready", "pid": os.getpid()})
+
+    parts = []
+    cell = 0
+    while True:
+        try:
+            line = sys.stdin.readline()
+            if not line:
+                return
+            line = line.strip()
+            if not line.startswith(IN_PREFIX):
+                continue
+            parts.append(line[len(IN_PREFIX) + 1:])
+            if line[len(IN_PREFIX)] == "+":
+                continue
+            message = json.loads(base64.b64decode("".join(parts)))
+            parts = []
+        except KeyboardInterrupt:
+            continue  # interrupted between cells, nothing to stop
+
+        if message.get("type") != "execute":
+            continue
+        cell += 1
+        status, error = "ok", ""
+        try:
+            run(message["code"], namespace, cell)
+        except KeyboardInterrupt:
+            status, error = "interrupted", "KeyboardInterrupt"
+        except SystemExit as e:
+            # the interpreter ends as a script would, the host starts a new one for the next cell
+            code = e.code
+            if code is not None and not isinstance(code, int):
+                print(code, file=sys.stderr)
+                code = 1
+            status, error = "exit", str(code or 0)
+        except BaseException as e:
+            status, error = "error", f"{type(e).__name__}: {e}"
+            # frames of the kernel are left out, the traceback starts in the cell
+            tb = e.__traceback__
+            while tb and not tb.tb_frame.f_code.co_filename.startswith("<cell-"):
+                tb = tb.tb_next
+            traceback.print_exception(type(e), e, tb, file=sys.stderr)
+        try:
+            stdout.flush()
+            stderr.flush()
+            send({"type": "done", "id": message.get("id"), "status": status, "error": error})
+        except KeyboardInterrupt:
+            send({"type": "done", "id": message.get("id"), "status": "interrupted", "error": "KeyboardInterrupt"})
+        if status == "exit":
+            return
+
+
+main()
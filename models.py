@@ -1,5 +1,8 @@
 from enum import Enum
+import hashlib
+import json
 import os
+import threading
 from typing import Any
 from langchain_openai import (
     ChatOpenAI,
@@ -28,7 +31,7 @@ from langchain_google_genai import (
 from langchain_mistralai import ChatMistralAI
 
 # from pydantic.v1.types import SecretStr
-from python.helpers import dotenv, runtime
+from python.helpers import dotenv, files, runtime
 from python.helpers.dotenv import load_dotenv
 from python.helpers.rate_limiter import RateLimiter
 
@@ -59,6 +62,10 @@ class ModelProvider(Enum):
 
 
 rate_limiters: dict[str, RateLimiter] = {}
+embedding_models: dict[str, Any] = {}
+embedding_models_lock = threading.Lock()
+
+EMBEDDING_DIMENSIONS_FILE = "memory/embeddings/dimensions.json"
 
 
 # Utility function to get API keys from environment variables
@@ -92,6 +99,48 @@ def get_rate_limiter(
     return limiter
 
 
+def get_embedding_model(provider: ModelProvider, name: str, **kwargs):
+    # get or create, loading local models is expensive so instances are shared
+    key = _get_embedding_key(provider, name, kwargs)
+    # a changed api key makes a new instance
+    instance_key = key + "\\" + get_api_key(provider.name.lower())
+    with embedding_models_lock:
+        model = embedding_models.get(instance_key)
+        if model is None:
+            model = get_model(ModelType.EMBEDDING, provider, name, **kwargs)
+            embedding_models[instance_key] = model
+    return model
+
+
+def get_embedding_dimension(provider: ModelProvider, name: str, **kwargs) -> int:
+    # dimensions are cached on disk so that a model does not need to be called to know it
+    key = hashlib.sha256(_get_embedding_key(provider, name, kwargs).encode()).hexdigest()
+    dimension = _read_embedding_dimensions().get(key)
+    if dimension is None:
+        model = get_embedding_model(provider, name, **kwargs)
+        dimension = len(model.embed_query("example"))
+        with embedding_models_lock:
+            dimensions = _read_embedding_dimensions()
+            dimensions[key] = dimension
+            files.write_file(EMBEDDING_DIMENSIONS_FILE, json.dumps(dimensions))
+    return dimension
+
+
+def _read_embedding_dimensions() -> dict[str, int]:
+    if not files.exists(EMBEDDING_DIMENSIONS_FILE):
+        return {}
+    return json.loads(files.read_file(EMBEDDING_DIMENSIONS_FILE))
+
+
+def clear_embedding_models():
+    with embedding_models_lock:
+        embedding_models.clear()
+
+
+def _get_embedding_key(provider: ModelProvider, name: str, kwargs: dict) -> str:
+    return f"{provider.name}\\{name}\\{json.dumps(kwargs, sort_keys=True, default=str)}"
+
+
 def parse_chunk(chunk: Any):
     if isinstance(chunk, str):
         content = chunk
@@ -22,9 +22,12 @@ async def preload():
         async def preload_embedding():
             if set["embed_model_provider"] == models.ModelProvider.HUGGINGFACE.name:
                 try:
-                    emb_mod = models.get_huggingface_embedding(set["embed_model_name"])
-                    emb_txt = await emb_mod.aembed_query("test")
-                    return emb_txt
+                    # downloads the weights and caches the dimension on disk
+                    return models.get_embedding_dimension(
+                        models.ModelProvider.HUGGINGFACE,
+                        set["embed_model_name"],
+                        **set["embed_model_kwargs"],
+                    )
                 except Exception as e:
                     PrintStyle().error(f"Error in preload_embedding: {e}")
 
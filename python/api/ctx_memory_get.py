@@ -0,0 +1,8 @@
+from python.helpers.api import ApiHandler, Input, Output, Request, Response
+
+from python.helpers import context_cache
+
+
+class GetCtxMemory(ApiHandler):
+    async def process(self, input: Input, request: Request) -> Output:
+        return context_cache.get_metrics()
@@ -0,0 +1,10 @@
+from python.helpers.api import ApiHandler, Input, Output, Request, Response
+
+from python.helpers import loop_monitor
+
+
+class GetLoopLag(ApiHandler):
+    async def process(self, input: Input, request: Request) -> Output:
+        if input.get("reset", False):
+            loop_monitor.reset()
+        return loop_monitor.get_report(int(input.get("limit", 20)))
@@ -1,5 +1,6 @@
 from python.helpers.api import ApiHandler
 from flask import Request, Response
+from python.helpers import changes
 
 
 class Pause(ApiHandler):
@@ -12,6 +13,7 @@ class Pause(ApiHandler):
             context = self.get_context(ctxid)
 
             context.paused = paused
+            changes.notify()
 
             return {
                 "message": "Agent paused." if paused else "Agent unpaused.",
@@ -5,8 +5,7 @@ from flask import Request, Response
 
 from agent import AgentContext
 
-from python.helpers import persist_chat
-from python.helpers.task_scheduler import TaskScheduler
+from python.helpers import persist_chat, sidebar_index
 from python.helpers.localization import Localization
 from python.helpers.dotenv import get_dotenv_value
 
@@ -24,85 +23,44 @@ class Poll(ApiHandler):
         # context instance - get or create
         context = self.get_context(ctxid)
 
-        logs = context.log.output(start=from_no)
-
-        # loop AgentContext._contexts
-
-        # Get a task scheduler instance
-        scheduler = TaskScheduler.get()
-
-        # Always reload the scheduler on each poll to ensure we have the latest task state
-        # await scheduler.reload() # does not seem to be needed
-
-        # loop AgentContext._contexts and divide into contexts and tasks
-
-        ctxs = []
-        tasks = []
-        processed_contexts = set()  # Track processed context IDs
-
-        all_ctxs = list(AgentContext._contexts.values())
-        # First, identify all tasks
-        for ctx in all_ctxs:
-            # Skip if already processed
-            if ctx.id in processed_contexts:
-                continue
-
-            # Create the base context data that will be returned
-            context_data = ctx.serialize()
-
-            context_task = scheduler.get_task_by_uuid(ctx.id)
-            # Determine if this is a task-dedicated context by checking if a task with this UUID exists
-            is_task_context = (
-                context_task is not None and context_task.context_id == ctx.id
-            )
-
-            if not is_task_context:
-                ctxs.append(context_data)
-            else:
-                # If this is a task, get task details from the scheduler
-                task_details = scheduler.serialize_task(ctx.id)
-                if task_details:
-                    # Add task details to context_data with the same field names
-                    # as used in scheduler endpoints to maintain UI compatibility
-                    context_data.update({
-                        "task_name": task_details.get("name"), # name is for context, task_name for the task name
-                        "uuid": task_details.get("uuid"),
-                        "state": task_details.get("state"),
-                        "type": task_details.get("type"),
-                        "system_prompt": task_details.get("system_prompt"),
-                        "prompt": task_details.get("prompt"),
-                        "last_run": task_details.get("last_run"),
-                        "last_result": task_details.get("last_result"),
-                        "attachments": task_details.get("attachments", []),
-                        "context_id": task_details.get("context_id"),
-                    })
-
-                    # Add type-specific fields
-                    if task_details.get("type") == "scheduled":
-                        context_data["schedule"] = task_details.get("schedule")
-                    elif task_details.get("type") == "planned":
-                        context_data["plan"] = task_details.get("plan")
-                    else:
-                        context_data["token"] = task_details.get("token")
-
-                tasks.append(context_data)
-
-            # Mark as processed
-            processed_contexts.add(ctx.id)
-
-        # Sort tasks and chats by their creation date, descending
-        ctxs.sort(key=lambda x: x["created_at"], reverse=True)
-        tasks.sort(key=lambda x: x["created_at"], reverse=True)
-
-        # data from this server
-        return {
-            "context": context.id,
-            "contexts": ctxs,
-            "tasks": tasks,
-            "logs": logs,
-            "log_guid": context.log.guid,
-            "log_version": len(context.log.updates),
-            "log_progress": context.log.progress,
-            "log_progress_active": context.log.progress_active,
-            "paused": context.paused,
-        }
+        # lengths of long texts the client has, only valid for the same log
+        lengths = (
+            input.get("log_lengths")
+            if input.get("log_guid") == context.log.guid
+            else None
+        )
+        return get_poll_output(
+            context, from_no, lengths, input.get("contexts_version")
+        )
+
+
+def get_poll_output(
+    context: AgentContext,
+    from_no: int = 0,
+    lengths: dict | None = None,
+    known_contexts_version: int | None = None,
+) -> dict:
+    """State of the context and the chat and task lists, log items changed since version from_no."""
+    # version before the output, changes made meanwhile are sent again next time instead of missed
+    log_version = context.log.version
+    logs = context.log.output(start=from_no, lengths=lengths)
+
+    # chat and task lists only when they changed since the client's version
+    contexts_version = sidebar_index.get_version()
+    lists = {}
+    if contexts_version != known_contexts_version:
+        contexts_version, ctxs, tasks = sidebar_index.get_lists()
+        lists = {"contexts": ctxs, "tasks": tasks}
+
+    # data from this server
+    return {
+        "context": context.id,
+        **lists,
+        "contexts_version": contexts_version,
+        "logs": logs,
+        "log_guid": context.log.guid,
+        "log_version": log_version,
+        "log_progress": context.log.progress,
+        "log_progress_active": context.log.progress_active,
+        "paused": context.paused,
+    }
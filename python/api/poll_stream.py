@@ -0,0 +1,95 @@
+import json
+import time
+from flask import Request, Response
+
+from agent import AgentContext
+from python.helpers.api import ApiHandler
+from python.helpers import changes
+from python.helpers.localization import Localization
+from python.helpers.dotenv import get_dotenv_value
+from python.api.poll import get_poll_output
+
+KEEPALIVE_INTERVAL = 15  # seconds without changes before the state is checked and a keepalive sent
+COALESCE_INTERVAL = 0.025  # seconds to collect a burst of changes (streamed tokens) into one event
+LOG_DELTA_MIN_LENGTH = 1024  # same as in the web ui, shorter texts are always sent whole
+
+
+class PollStream(ApiHandler):
+    """Server-sent events with the /poll output of a context, pushed whenever something changes.
+
+    Log versions and lengths of long texts the client has are tracked here, so each event
+    only carries what changed since the previous one. /poll remains as the fallback.
+    """
+
+    async def process(self, input: dict, request: Request) -> dict | Response:
+        args = request.args
+        timezone = args.get("timezone", get_dotenv_value("DEFAULT_USER_TIMEZONE", "UTC"))
+        Localization.get().set_timezone(timezone)
+
+        context = self.get_context(args.get("context", ""))
+        guid = context.log.guid
+        log_from = int(args.get("log_from", 0) or 0) if args.get("log_guid") == guid else 0
+
+        def stream():
+            nonlocal guid, log_from
+            lengths: dict[str, dict[str, int]] = {}
+            contexts_version = None
+            state = None
+
+            while True:
+                version = changes.get_version()
+                if context.log.guid != guid:
+                    guid, log_from, lengths = context.log.guid, 0, {}
+
+                output = get_poll_output(context, log_from, lengths, contexts_version)
+                _update_lengths(lengths, output["logs"])
+                log_from = output["log_version"]
+                contexts_version = output["contexts_version"]
+
+                # logs and lists are sent when changed, the rest when it differs from the last event
+                current = json.dumps(
+                    {k: v for k, v in output.items() if k not in ("logs", "contexts", "tasks")}
+                )
+                if output["logs"] or current != state:
+                    state = current
+                    yield f"data: {json.dumps(output)}\n\n"
+
+                # the context was removed or replaced, the client opens a new stream
+                if AgentContext.get_loaded(context.id) is not context:
+                    yield "event: close\ndata: {}\n\n"
+                    return
+
+                context.touch()  # an open stream keeps the context loaded
+                if changes.wait(version, KEEPALIVE_INTERVAL) == version:
+                    yield ": keepalive\n\n"
+                else:
+                    time.sleep(COALESCE_INTERVAL)
+
+        return Response(
+            stream(),
+            mimetype="text/event-stream",
+            headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+        )
+
+
+def _update_lengths(lengths: dict[str, dict[str, int]], logs: list[dict]):
+    # lengths of long texts the client has after applying the sent log items
+    for log in logs:
+        no = str(log["no"])
+        known = lengths.get(no, {})
+        appended = log.get("appended", [])
+        fields = {"heading": log["heading"], "content": log["content"]}
+        fields.update({f"kvps.{k}": v for k, v in (log["kvps"] or {}).items()})
+
+        current = {}
+        for key, value in fields.items():
+            if not isinstance(value, str):
+                continue
+            length = len(value) + (known.get(key, 0) if key in appended else 0)
+            if length >= LOG_DELTA_MIN_LENGTH:
+                current[key] = length
+
+        if current:
+            lengths[no] = current
+        else:
+            lengths.pop(no, None)
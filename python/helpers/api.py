@@ -6,6 +6,7 @@ from attr import dataclass
 from flask import Request, Response, jsonify, Flask
 from agent import AgentContext
 from initialize import initialize
+from python.helpers import persist_chat
 from python.helpers.print_style import PrintStyle
 from python.helpers.errors import format_error
 from werkzeug.serving import make_server
@@ -75,9 +76,14 @@ class ApiHandler:
         with self.thread_lock:
             if not ctxid:
                 first = AgentContext.first()
+                if not first:
+                    # nothing loaded yet, open a saved chat
+                    saved = persist_chat.get_chat_ids()
+                    first = AgentContext.get(saved[0]) if saved else None
                 if first:
                     return first
                 return AgentContext(config=initialize())
+            # saved contexts are loaded on first access
             got = AgentContext.get(ctxid)
             if got:
                 return got
@@ -0,0 +1,24 @@
+import threading
+
+# process-wide signal of state changes shown in the web ui (logs, progress, contexts, tasks)
+# push channels wait on it instead of polling
+_condition = threading.Condition()
+_version = 0
+
+
+def notify():
+    global _version
+    with _condition:
+        _version += 1
+        _condition.notify_all()
+
+
+def get_version() -> int:
+    return _version
+
+
+def wait(version: int, timeout: float | None = None) -> int:
+    """Block until there is a change after version or the timeout passes, return the current version."""
+    with _condition:
+        _condition.wait_for(lambda: _version != version, timeout)
+        return _version
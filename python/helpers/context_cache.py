@@ -0,0 +1,154 @@
+import threading
+import time
+import weakref
+from collections.abc import Mapping
+from typing import Any
+
+from agent import Agent, AgentContext
+from python.helpers import persist_chat, settings, errors, history
+from python.helpers.print_style import PrintStyle
+
+IDLE_SECONDS = 5 * 60  # contexts used more recently stay loaded
+BYTES_PER_TOKEN = 4  # rough memory of history text per token
+# agent data that cannot be saved (terminal sessions, browsers), contexts holding it stay loaded
+RUNTIME_STATE_KEYS = ("_cet_state", "_browser_state", "_browser_agent_state")
+
+_lock = threading.Lock()
+_log_sizes: dict[str, tuple[str, int, int]] = {}  # context id -> log guid, version and size
+# size of raw message content, images and attachments count in tokens by their preview only
+_raw_sizes: "weakref.WeakKeyDictionary[history.Message, int]" = weakref.WeakKeyDictionary()
+
+
+def get_context_size(context: AgentContext) -> int:
+    """Approximate memory in bytes used by the histories and the log of the context."""
+    size = sum(
+        agent.history.get_tokens() * BYTES_PER_TOKEN + _get_raw_size(agent.history)
+        for agent in _get_agents(context)
+    )
+    return size + _get_log_size(context)
+
+
+def is_idle(context: AgentContext, now: float | None = None) -> bool:
+    """Not running, not used for a while and holding nothing that would be lost by unloading."""
+    if context.task and context.task.is_alive():
+        return False
+    if (now or time.time()) - context.last_used < IDLE_SECONDS:
+        return False
+    return not any(
+        agent.data.get(key) for agent in _get_agents(context) for key in RUNTIME_STATE_KEYS
+    )
+
+
+def evict_idle_contexts() -> list[str]:
+    """Save and unload idle contexts, least recently used first, while over the limits from settings."""
+    set = settings.get_settings()
+    max_loaded = set["chats_max_loaded"]
+    max_size = set["chats_max_memory"] * 1024 * 1024
+
+    with _lock:
+        contexts = list(AgentContext._contexts.values())
+        sizes = {context.id: get_context_size(context) for context in contexts}
+        count, total = len(contexts), sum(sizes.values())
+        now = time.time()
+
+        evicted = []
+        for context in sorted(contexts, key=lambda c: c.last_used):
+            if not (
+                (max_loaded > 0 and count > max_loaded)
+                or (max_size > 0 and total > max_size)
+            ):
+                break
+            if not is_idle(context, now):
+                continue
+            with context.unload_lock:
+                # a message may have arrived since the check, tasks cannot start from here on
+                if not is_idle(context, time.time()):
+                    continue
+                try:
+                    persist_chat.unload_tmp_chat(context)
+                except Exception as e:
+                    PrintStyle.error(f"Error unloading chat {context.id}: {errors.format_error(e)}")
+                    continue
+            _log_sizes.pop(context.id, None)
+            count -= 1
+            total -= sizes[context.id]
+            evicted.append(context.id)
+        return evicted
+
+
+def get_metrics() -> dict[str, Any]:
+    """Loaded contexts with their approximate memory, largest first, and the limits."""
+    set = settings.get_settings()
+    now = time.time()
+    contexts = [
+        {
+            "id": context.id,
+            "name": context.name,
+            "size": get_context_size(context),
+            "idle_seconds": int(now - context.last_used),
+            "running": bool(context.task and context.task.is_alive()),
+            "evictable": is_idle(context, now),
+        }
+        for context in list(AgentContext._contexts.values())
+    ]
+    contexts.sort(key=lambda c: c["size"], reverse=True)
+    return {
+        "loaded": len(contexts),
+        "saved": len(persist_chat.get_chat_ids()),
+        "size": sum(c["size"] for c in contexts),
+        "max_loaded": set["chats_max_loaded"],
+        "max_size": set["chats_max_memory"] * 1024 * 1024,
+        "contexts": contexts,
+    }
+
+
+def _get_agents(context: AgentContext) -> list[Agent]:
+    agents = []
+    agent = context.agent0
+    while agent:
+        agents.append(agent)
+        agent = agent.data.get(Agent.DATA_NAME_SUBORDINATE, None)
+    return agents
+
+
+def _get_raw_size(hist: history.History) -> int:
+    size = 0
+    records: list[history.Record] = [*hist.bulks, *hist.topics, hist.current]
+    while records:
+        record = records.pop()
+        if isinstance(record, history.Bulk):
+            records.extend(record.records)
+        elif isinstance(record, history.Topic):
+            records.extend(record.messages)
+        elif isinstance(record, history.Message) and history._is_raw_message(record.content):
+            if record not in _raw_sizes:
+                _raw_sizes[record] = _get_content_size(record.content["raw_content"])  # type: ignore
+            size += _raw_sizes[record]
+    return size
+
+
+def _get_content_size(content: Any) -> int:
+    # base64 data of images and files is in the strings
+    if isinstance(content, str):
+        return len(content)
+    if isinstance(content, Mapping):
+        return sum(_get_content_size(value) for value in content.values())
+    if isinstance(content, list):
+        return sum(_get_content_size(item) for item in content)
+    return 0
+
+
+def _get_log_size(context: AgentContext) -> int:
+    # recounted only when the log changed
+    log = context.log
+    cached = _log_sizes.get(context.id)
+    if cached and cached[0] == log.guid and cached[1] == log.version:
+        return cached[2]
+    size = sum(
+        len(item.heading)
+        + len(item.content)
+        + sum(len(str(v)) for v in (item.kvps or {}).values())
+        for item in list(log.logs)
+    )
+    _log_sizes[context.id] = (log.guid, log.version, size)
+    return size
@@ -1,11 +1,16 @@
 import asyncio
 from dataclasses import dataclass
 import threading
+import time
 from concurrent.futures import Future
 from typing import Any, Callable, Optional, Coroutine, TypeVar, Awaitable
 
 T = TypeVar("T")
 
+HEARTBEAT_INTERVAL = 0.5  # seconds between lag measurements of each loop
+LAG_THRESHOLD = 1.0  # seconds a loop may be blocked before it counts as lagging
+
+
 class EventLoopThread:
     _instances = {}
     _lock = threading.Lock()
@@ -13,6 +18,9 @@ class EventLoopThread:
     def __init__(self, thread_name: str = "default") -> None:
         """Initialize the event loop thread."""
         self.thread_name = thread_name
+        if not hasattr(self, "lag"):
+            self.lag = 0.0
+            self._heartbeat_due = time.monotonic()
         self._start()
 
     def __new__(cls, thread_name: str = "default"):
@@ -25,6 +33,8 @@ class EventLoopThread:
     def _start(self):
         if not hasattr(self, "loop") or not self.loop:
             self.loop = asyncio.new_event_loop()
+            self._heartbeat_due = time.monotonic()
+            self.loop.call_soon_threadsafe(self._heartbeat)
         if not hasattr(self, "thread") or not self.thread:
             self.thread = threading.Thread(
                 target=self._run_event_loop, daemon=True, name=self.thread_name
@@ -49,6 +59,79 @@ class EventLoopThread:
             raise RuntimeError("Event loop is not initialized")
         return asyncio.run_coroutine_threadsafe(coro, self.loop)
 
+    def get_lag(self) -> float:
+        """Seconds the loop was late on its last heartbeat, or is late now while blocked."""
+        return max(self.lag, self.get_blocked())
+
+    def get_blocked(self) -> float:
+        """Seconds the loop has been blocked so far, 0 while it runs."""
+        return max(0.0, time.monotonic() - self._heartbeat_due)
+
+    def _heartbeat(self):
+        # a callback scheduled at a fixed interval runs late by as long as the loop was blocked
+        now = time.monotonic()
+        self.lag = max(0.0, now - self._heartbeat_due)
+        self._heartbeat_due = now + HEARTBEAT_INTERVAL
+        asyncio.get_running_loop().call_later(HEARTBEAT_INTERVAL, self._heartbeat)
+
+
+class EventLoopPool:
+    """A fixed number of event loop threads shared by keys, each key runs on one thread.
+
+    Spreading contexts over several loops keeps a blocking call in one chat from
+    stalling all the others. New keys go to the thread with the fewest keys,
+    preferring loops that are not lagging.
+    """
+
+    _instances: dict[str, "EventLoopPool"] = {}
+    _lock = threading.Lock()
+
+    def __init__(self, name: str, size: int) -> None:
+        self.name = name
+        self.size = max(1, size)
+        self._keys: dict[str, int] = {}  # key -> thread index
+
+    @classmethod
+    def get(cls, name: str, size: int) -> "EventLoopPool":
+        with cls._lock:
+            if name not in cls._instances:
+                cls._instances[name] = cls(name, size)
+            return cls._instances[name]
+
+    def get_thread_name(self, key: str) -> str:
+        """Name of the thread for DeferredTask, the same for a key until it is released."""
+        with self._lock:
+            index = self._keys.get(key)
+            if index is None:
+                counts = [0] * self.size
+                for i in self._keys.values():
+                    counts[i] += 1
+                index = min(
+                    range(self.size), key=lambda i: (self._is_lagging(i), counts[i])
+                )
+                self._keys[key] = index
+            return self._get_thread_name(index)
+
+    def release(self, key: str):
+        with self._lock:
+            self._keys.pop(key, None)
+
+    def get_threads(self) -> list[EventLoopThread]:
+        """Threads of the pool started so far."""
+        names = [self._get_thread_name(i) for i in range(self.size)]
+        return [
+            EventLoopThread._instances[name]
+            for name in names
+            if name in EventLoopThread._instances
+        ]
+
+    def _is_lagging(self, index: int) -> bool:
+        thread = EventLoopThread._instances.get(self._get_thread_name(index))
+        return bool(thread and thread.get_lag() > LAG_THRESHOLD)
+
+    def _get_thread_name(self, index: int) -> str:
+        return f"{self.name}-{index}"
+
 
 @dataclass
 class ChildTask:
@@ -0,0 +1,138 @@
+import asyncio
+import threading
+from concurrent.futures import Future
+from typing import Any
+
+from langchain_core.embeddings import Embeddings
+
+
+class EmbeddingBatcher(Embeddings):
+    """Embeddings wrapper coalescing concurrent async requests into batched calls.
+
+    Documents requested within a short window are embedded together, up to max_batch_size
+    per call and max_concurrency calls at a time. Concurrent identical queries share one call.
+    Requests may come from any event loop, a batch runs on the loop of the request that started it.
+    """
+
+    def __init__(
+        self,
+        embeddings: Embeddings,
+        max_batch_size: int = 64,
+        max_concurrency: int = 4,
+        window: float = 0.01,
+    ):
+        self.embeddings = embeddings
+        self.max_batch_size = max_batch_size
+        self.max_concurrency = max_concurrency
+        self.window = window
+        self._lock = threading.Lock()
+        self._pending: list[tuple[str, Future]] = []
+        self._queries: dict[str, Future] = {}
+        self._scheduled = False  # a batch is waiting for the window to pass
+        self._running = 0  # batch tasks, each runs until nothing is pending
+        self._tasks: set[asyncio.Task] = set()
+
+    # sync calls are not batched
+    def embed_documents(self, texts: list[str]) -> list[list[float]]:
+        return self.embeddings.embed_documents(texts)
+
+    def embed_query(self, text: str) -> list[float]:
+        return self.embeddings.embed_query(text)
+
+    async def aembed_documents(self, texts: list[str]) -> list[list[float]]:
+        futures: list[Future] = []
+        with self._lock:
+            for text in texts:
+                future = Future()
+                self._pending.append((text, future))
+                futures.append(future)
+            self._schedule()
+        return list(await asyncio.gather(*[asyncio.wrap_future(f) for f in futures]))
+
+    async def aembed_query(self, text: str) -> list[float]:
+        with self._lock:
+            future = self._queries.get(text)
+            owner = future is None
+            if owner:
+                future = self._queries[text] = Future()
+        if owner:
+            try:
+                _set_result(future, await self.embeddings.aembed_query(text))  # type: ignore
+            except Exception as e:
+                _set_exception(future, e)  # type: ignore
+            except BaseException:
+                future.cancel()  # type: ignore
+                raise
+            finally:
+                with self._lock:
+                    del self._queries[text]
+        return await asyncio.wrap_future(future)  # type: ignore
+
+    def _schedule(self):
+        # called with the lock held after adding pending texts
+        if self._running >= self.max_concurrency:
+            return  # running batches pick the texts up
+        if len(self._pending) >= self.max_batch_size:
+            self._start(0)
+        elif not self._scheduled:
+            self._scheduled = True
+            self._start(self.window)
+
+    def _start(self, delay: float):
+        self._running += 1
+        task = asyncio.get_running_loop().create_task(self._run(delay))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def _run(self, delay: float):
+        batch: list[tuple[str, Future]] = []
+        finished = False
+        try:
+            if delay:
+                try:
+                    await asyncio.sleep(delay)
+                finally:
+                    with self._lock:
+                        self._scheduled = False
+
+            while True:
+                with self._lock:
+                    batch = self._pending[: self.max_batch_size]
+                    del self._pending[: self.max_batch_size]
+                    if not batch:
+                        # counted out in the same step that found nothing pending,
+                        # texts added after this start a batch of their own
+                        self._running -= 1
+                        finished = True
+                        return
+
+                texts = list(dict.fromkeys(text for text, _ in batch))
+                try:
+                    vectors = dict(
+                        zip(texts, await self.embeddings.aembed_documents(texts))
+                    )
+                except Exception as e:
+                    for _, future in batch:
+                        _set_exception(future, e)
+                else:
+                    for text, future in batch:
+                        _set_result(future, vectors[text])
+                batch = []
+        finally:
+            # the loop running this batch is going away, do not leave anyone waiting
+            for _, future in batch:
+                future.cancel()
+            if not finished:
+                with self._lock:
+                    self._running -= 1
+
+
+# waiters may have given up already
+def _set_result(future: Future, result: Any):
+    if not future.done():
+        future.set_result(result)
+
+
+def _set_exception(future: Future, exception: BaseException):
+    if not future.done():
+        future.set_exception(exception)
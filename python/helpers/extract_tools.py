@@ -1,4 +1,4 @@
-import re, os, importlib, inspect
+import re, os, importlib, inspect, threading
 from typing import Any, Type, TypeVar
 from .dirty_json import DirtyJson
 from .files import get_abs_path
@@ -51,19 +51,59 @@ def fix_json_string(json_string):
 
 T = TypeVar('T')  # Define a generic type variable
 
+# process-wide registry of plugin folders (tools, extensions, api handlers)
+# folder -> (directory mtime, sorted list of .py files)
+_folder_files: dict[str, tuple[int, list[str]]] = {}
+# (module path, base class, one_per_file) -> classes found in the module
+_module_classes: dict[tuple[str, type, bool], list[type]] = {}
+_registry_lock = threading.RLock()
+
+
 def load_classes_from_folder(folder: str, name_pattern: str, base_class: Type[T], one_per_file: bool = True) -> list[Type[T]]:
     classes = []
-    abs_folder = get_abs_path(folder)
 
-    # Get all .py files in the folder that match the pattern, sorted alphabetically
-    py_files = sorted(
-        [file_name for file_name in os.listdir(abs_folder) if fnmatch(file_name, name_pattern) and file_name.endswith(".py")]
-    )
+    # exact file names (tools) do not need to be matched against the whole folder
+    py_files = _get_folder_files(folder)
+    if any(c in name_pattern for c in "*?["):
+        py_files = [file_name for file_name in py_files if fnmatch(file_name, name_pattern)]
+    elif name_pattern in py_files:
+        py_files = [name_pattern]
+    else:
+        py_files = []
 
     # Iterate through the sorted list of files
     for file_name in py_files:
         module_name = file_name[:-3]  # remove .py extension
         module_path = folder.replace("/", ".") + "." + module_name
+        classes += _get_module_classes(module_path, base_class, one_per_file)
+
+    return classes
+
+
+def _get_folder_files(folder: str) -> list[str]:
+    abs_folder = get_abs_path(folder)
+    # directory mtime changes when files are added, removed or renamed
+    mtime = os.stat(abs_folder).st_mtime_ns
+    cached = _folder_files.get(folder)
+    if cached and cached[0] == mtime:
+        return cached[1]
+
+    with _registry_lock:
+        # Get all .py files in the folder, sorted alphabetically
+        py_files = sorted(
+            [file_name for file_name in os.listdir(abs_folder) if file_name.endswith(".py")]
+        )
+        _folder_files[folder] = (mtime, py_files)
+        return py_files
+
+
+def _get_module_classes(module_path: str, base_class: type, one_per_file: bool) -> list[type]:
+    key = (module_path, base_class, one_per_file)
+    cached = _module_classes.get(key)
+    if cached is not None:
+        return cached
+
+    with _registry_lock:
         module = importlib.import_module(module_path)
 
         # Get all classes in the module
@@ -71,10 +111,12 @@ def load_classes_from_folder(folder: str, name_pattern: str, base_class: Type[T]
 
         # Filter for classes that are subclasses of the given base_class
         # iterate backwards to skip imported superclasses
+        classes = []
         for cls in reversed(class_list):
             if cls[1] is not base_class and issubclass(cls[1], base_class):
                 classes.append(cls[1])
                 if one_per_file:
                     break
 
-    return classes
\ No newline at end of file
+        _module_classes[key] = classes
+        return classes
@@ -130,18 +130,28 @@ class Topic(Record):
         self.history = history
         self.summary: str = ""
         self.messages: list[Message] = []
+        self._tokens: int | None = None  # cached token count, None when dirty
 
     def get_tokens(self):
-        if self.summary:
-            return tokens.approximate_tokens(self.summary)
-        else:
-            return sum(msg.get_tokens() for msg in self.messages)
+        if self._tokens is None:
+            if self.summary:
+                self._tokens = tokens.approximate_tokens(self.summary)
+            else:
+                self._tokens = sum(msg.get_tokens() for msg in self.messages)
+        return self._tokens
+
+    def invalidate_tokens(self):
+        self._tokens = None
+        self.history.changes += 1
 
     def add_message(
         self, ai: bool, content: MessageContent, tokens: int = 0
     ) -> Message:
         msg = Message(ai=ai, content=content, tokens=tokens)
         self.messages.append(msg)
+        # keep running total up to date
+        if self._tokens is not None and not self.summary:
+            self._tokens += msg.get_tokens()
         return msg
 
     def output(self) -> list[OutputMessage]:
@@ -153,6 +163,7 @@ class Topic(Record):
 
     async def summarize(self):
         self.summary = await self.summarize_messages(self.messages)
+        self.invalidate_tokens()
         return self.summary
 
     async def compress_large_messages(self) -> bool:
@@ -191,6 +202,7 @@ class Topic(Record):
                 )
                 msg.set_summary(_json_dumps(trunc))
 
+            self.invalidate_tokens()
             return True
         return False
 
@@ -211,6 +223,7 @@ class Topic(Record):
             )
             sum_msg = Message(False, sum_msg_content)
             self.messages[1 : cnt_to_sum + 1] = [sum_msg]
+            self.invalidate_tokens()
             return True
         return False
 
@@ -247,12 +260,19 @@ class Bulk(Record):
         self.history = history
         self.summary: str = ""
         self.records: list[Record] = []
+        self._tokens: int | None = None  # cached token count, None when dirty
 
     def get_tokens(self):
-        if self.summary:
-            return tokens.approximate_tokens(self.summary)
-        else:
-            return sum([r.get_tokens() for r in self.records])
+        if self._tokens is None:
+            if self.summary:
+                self._tokens = tokens.approximate_tokens(self.summary)
+            else:
+                self._tokens = sum([r.get_tokens() for r in self.records])
+        return self._tokens
+
+    def invalidate_tokens(self):
+        self._tokens = None
+        self.history.changes += 1
 
     def output(
         self, human_label: str = "user", ai_label: str = "ai"
@@ -273,6 +293,7 @@ class Bulk(Record):
                 "fw.topic_summary.msg.md", content=self.output_text()
             ),
         )
+        self.invalidate_tokens()
         return self.summary
 
     def to_dict(self):
@@ -295,10 +316,15 @@ class History(Record):
     def __init__(self, agent):
         from agent import Agent
 
+        # counts changes other than added messages and topics, for incremental saving
+        self.changes = 0
         self.bulks: list[Bulk] = []
         self.topics: list[Topic] = []
         self.current = Topic(history=self)
         self.agent: Agent = agent
+        # cached token totals of topics and bulks, None when dirty
+        self._topics_tokens: int | None = None
+        self._bulks_tokens: int | None = None
 
     def get_tokens(self) -> int:
         return (
@@ -313,10 +339,14 @@ class History(Record):
         return total > limit
 
     def get_bulks_tokens(self) -> int:
-        return sum(record.get_tokens() for record in self.bulks)
+        if self._bulks_tokens is None:
+            self._bulks_tokens = sum(record.get_tokens() for record in self.bulks)
+        return self._bulks_tokens
 
     def get_topics_tokens(self) -> int:
-        return sum(record.get_tokens() for record in self.topics)
+        if self._topics_tokens is None:
+            self._topics_tokens = sum(record.get_tokens() for record in self.topics)
+        return self._topics_tokens
 
     def get_current_topic_tokens(self) -> int:
         return self.current.get_tokens()
@@ -328,9 +358,19 @@ class History(Record):
 
     def new_topic(self):
         if self.current.messages:
+            if self._topics_tokens is not None:
+                self._topics_tokens += self.current.get_tokens()
             self.topics.append(self.current)
             self.current = Topic(history=self)
 
+    def invalidate_tokens(self):
+        # to be called after records were modified from outside of history
+        for record in [*self.bulks, *self.topics, self.current]:
+            record.invalidate_tokens()
+        self._topics_tokens = None
+        self._bulks_tokens = None
+        self.changes += 1
+
     def output(self) -> list[OutputMessage]:
         result: list[OutputMessage] = []
         result += [m for b in self.bulks for m in b.output()]
@@ -343,6 +383,7 @@ class History(Record):
         history.bulks = [Bulk.from_dict(b, history=history) for b in data["bulks"]]
         history.topics = [Topic.from_dict(t, history=history) for t in data["topics"]]
         history.current = Topic.from_dict(data["current"], history=history)
+        history.invalidate_tokens()
         return history
 
     def to_dict(self):
@@ -396,6 +437,7 @@ class History(Record):
         for topic in self.topics:
             if not topic.summary:
                 await topic.summarize()
+                self._topics_tokens = None
                 return True
 
         # move oldest topic to bulks and summarize
@@ -408,6 +450,9 @@ class History(Record):
                 await bulk.summarize()
             self.bulks.append(bulk)
             self.topics.remove(topic)
+            self._topics_tokens = None
+            self._bulks_tokens = None
+            self.changes += 1
             return True
         return False
 
@@ -417,6 +462,8 @@ class History(Record):
         # remove oldest bulk if necessary
         if not compressed:
             self.bulks.pop(0)
+            self._bulks_tokens = None
+            self.changes += 1
             return True
         return compressed
 
@@ -432,6 +479,8 @@ class History(Record):
             ]
         )
         self.bulks = bulks
+        self._bulks_tokens = None
+        self.changes += 1
         return True
 
     async def merge_bulks(self, bulks: list[Bulk]) -> Bulk:
@@ -1,7 +1,7 @@
 import asyncio
 from python.helpers.task_scheduler import TaskScheduler
 from python.helpers.print_style import PrintStyle
-from python.helpers import errors
+from python.helpers import errors, context_cache
 
 
 async def run_loop():
@@ -10,6 +10,10 @@ async def run_loop():
             await scheduler_tick()
         except Exception as e:
             PrintStyle().error(errors.format_error(e))
+        try:
+            context_cache.evict_idle_contexts()
+        except Exception as e:
+            PrintStyle().error(errors.format_error(e))
         await asyncio.sleep(60) # TODO! - if we lower it under 1min, it can run a 5min job multiple times in it's target minute
 
 
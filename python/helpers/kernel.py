@@ -0,0 +1,137 @@
+import base64
+import json
+import shlex
+import signal
+import time
+import uuid
+from typing import Any
+
+from python.helpers import files
+
+IN_PREFIX = "@@A0I"  # host to kernel, followed by + when more parts follow or . for the last part
+OUT_PREFIX = "@@A0K>"  # kernel to host
+INPUT_LINE_LENGTH = 1000  # characters of a message per input line, terminals cut long lines
+START_TIMEOUT = 30  # seconds for the interpreter to start
+
+# runtime -> command starting the interpreter with the source as argument, kernel source
+RUNTIMES = {
+    "python": ("python3 -u -c", "lib/kernels/python_kernel.py"),
+    "nodejs": ("node -e", "lib/kernels/node_kernel.js"),
+}
+
+
+class Kernel:
+    """Interpreter of a runtime kept running in its own shell session, cells share its state.
+
+    Code and results are exchanged as framed messages over the shell, so a cell returns
+    as soon as it finished, with its status, instead of when the terminal falls silent.
+    Lines the code writes directly to the terminal are returned as output as well.
+    """
+
+    def __init__(self, shell, runtime: str):
+        self.shell = shell
+        self.runtime = runtime
+        self.pid: int | None = None
+        self.running: str | None = None  # id of the cell being executed
+        self.exited = False
+        self._line = ""  # incomplete last line of the shell output
+
+    async def start(self, timeout: float = START_TIMEOUT):
+        command, script = RUNTIMES[self.runtime]
+        source = files.read_file(script)
+        # the shell reports the end of the interpreter, the quotes keep the typed command from matching
+        exit_line = shlex.quote(OUT_PREFIX[:-1]) + shlex.quote(OUT_PREFIX[-1] + _encode({"type": "exit"}))
+        self.shell.send_command(f"{command} {shlex.quote(source)}; echo {exit_line}")
+
+        start_time = time.time()
+        while self.pid is None:
+            remaining = timeout - (time.time() - start_time)
+            if remaining <= 0 or not self.is_alive():
+                raise Exception(f"The {self.runtime} interpreter did not start.")
+            await self.read(remaining)
+
+    def execute(self, code: str):
+        if self.running:
+            raise Exception("The previous code is still running.")
+        self.running = str(uuid.uuid4())
+        data = _encode({"type": "execute", "id": self.running, "code": code})
+        parts = [data[i : i + INPUT_LINE_LENGTH] for i in range(0, len(data), INPUT_LINE_LENGTH)]
+        self.shell.send_command(
+            "\n".join(
+                IN_PREFIX + ("." if i == len(parts) - 1 else "+") + part
+                for i, part in enumerate(parts)
+            )
+        )
+
+    async def read(self, timeout: float | None = None) -> tuple[str, dict[str, Any] | None]:
+        """Wait up to timeout for output, return the new output and the result once the cell finished."""
+        await self.shell.wait_output(timeout)
+        _, partial_output = await self.shell.read_output()
+        if not partial_output:
+            if not self.shell.is_alive():
+                return "", self._exit()
+            return "", None
+
+        lines = (self._line + partial_output).split("\n")
+        self._line = lines.pop()
+        output, result = "", None
+        for line in lines:
+            text, message = self._parse(line)
+            output += text
+            if message and message.get("type") == "output":
+                output += message.get("text", "")
+            elif message:
+                result = self._handle(message) or result
+
+        # an incomplete line is output already, unless it could be the start of a message
+        if self.running and self._line and "@" not in self._line:
+            output += self._line
+            self._line = ""
+        return output, result
+
+    def interrupt(self):
+        if self.running and self.pid:
+            self.shell.send_signal(self.pid, signal.SIGINT)
+
+    def is_alive(self) -> bool:
+        return not self.exited and self.shell.is_alive()
+
+    def close(self):
+        self.shell.close()
+
+    def _parse(self, line: str) -> tuple[str, dict[str, Any] | None]:
+        index = line.find(OUT_PREFIX)
+        if index < 0:
+            if line.strip().startswith(IN_PREFIX):
+                return "", None  # input echoed by the terminal
+            # only output of a cell, not of the shell starting the interpreter
+            return (line + "\n" if self.running else ""), None
+        try:
+            message = json.loads(base64.b64decode(line[index + len(OUT_PREFIX) :].strip()))
+        except ValueError:
+            return (line + "\n" if self.running else ""), None
+        return line[:index], message
+
+    def _handle(self, message: dict[str, Any]) -> dict[str, Any] | None:
+        type = message.get("type")
+        if type == "ready":
+            self.pid = message.get("pid")
+        elif type == "done" and message.get("id") == self.running:
+            self.running = None
+            if message.get("status") == "exit":
+                self.exited = True  # the interpreter ended, the shell is back at its prompt
+            return message
+        elif type == "exit":
+            return self._exit()
+        return None
+
+    def _exit(self) -> dict[str, Any] | None:
+        self.exited = True
+        if not self.running:
+            return None
+        self.running = None
+        return {"type": "done", "status": "exit", "error": ""}
+
+
+def _encode(message: dict[str, Any]) -> str:
+    return base64.b64encode(json.dumps(message).encode()).decode()
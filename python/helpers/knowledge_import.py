@@ -1,8 +1,12 @@
+import asyncio
 import glob
+import multiprocessing
 import os
 import hashlib
 import json
-from typing import Any, Dict, Literal, TypedDict
+from concurrent.futures import ProcessPoolExecutor
+from typing import Any, Dict, Literal, NotRequired, TypedDict
+from langchain_core.documents import Document
 from langchain_community.document_loaders import (
     CSVLoader,
     JSONLoader,
@@ -17,10 +21,31 @@ from python.helpers.print_style import PrintStyle
 
 text_loader_kwargs = {"autodetect_encoding": True}
 
+# Mapping file extensions to corresponding loader classes
+file_types_loaders = {
+    "txt": TextLoader,
+    "pdf": PyPDFLoader,
+    "csv": CSVLoader,
+    "html": UnstructuredHTMLLoader,
+    # "json": JSONLoader,
+    "json": TextLoader,
+    # "md": UnstructuredMarkdownLoader,
+    "md": TextLoader,
+}
+
+# parsing runs in worker processes once there are enough changed files to pay off their startup
+PARSE_WORKERS = min(4, os.cpu_count() or 1)
+PARSE_POOL_MIN_FILES = 8
+CHECKSUM_CHUNK_SIZE = 1024 * 1024
+
+_parse_pool: ProcessPoolExecutor | None = None
+
 
 class KnowledgeImport(TypedDict):
     file: str
     checksum: str
+    size: NotRequired[int]
+    mtime: NotRequired[int]
     ids: list[str]
     state: Literal["changed", "original", "removed"]
     documents: list[Any]
@@ -29,99 +54,136 @@ class KnowledgeImport(TypedDict):
 def calculate_checksum(file_path: str) -> str:
     hasher = hashlib.md5()
     with open(file_path, "rb") as f:
-        buf = f.read()
-        hasher.update(buf)
+        for chunk in iter(lambda: f.read(CHECKSUM_CHUNK_SIZE), b""):
+            hasher.update(chunk)
     return hasher.hexdigest()
 
 
-def load_knowledge(
+def load_file(file_path: str) -> list[Document]:
+    ext = file_path.split(".")[-1].lower()
+    loader_cls = file_types_loaders[ext]
+    loader = loader_cls(
+        file_path,
+        **(text_loader_kwargs if ext in ["txt", "csv", "html", "md"] else {}),
+    )
+    return loader.load_and_split()
+
+
+async def load_knowledge(
     log_item: LogItem | None,
     knowledge_dir: str,
     index: Dict[str, KnowledgeImport],
     metadata: dict[str, Any] = {},
     filename_pattern: str = "**/*",
+    queue: asyncio.Queue | None = None,
 ) -> Dict[str, KnowledgeImport]:
+    """Mark files in the index as original or changed and parse the changed ones.
+
+    Parsed documents of each changed file are put to the queue as (file, documents)
+    if given, otherwise stored in the index entry.
+    """
+
+    # Fetch all files in the directory with specified extensions,
+    # unchanged size and mtime skip hashing
+    changed = await asyncio.to_thread(
+        _scan_files, knowledge_dir, index, filename_pattern
+    )
+    if not changed:
+        return index
+
+    PrintStyle.standard(
+        f"Found {len(changed)} new or changed knowledge files in {knowledge_dir}, processing..."
+    )
+    if log_item:
+        log_item.stream(
+            progress=f"\nFound {len(changed)} new or changed knowledge files in {knowledge_dir}, processing...",
+        )
 
-    # from python.helpers.memory import Memory
+    loop = asyncio.get_running_loop()
+    pool = _get_parse_pool() if len(changed) >= PARSE_POOL_MIN_FILES else None
+    # a file holds its slot until its documents are queued, so parsing can not run away from embedding
+    slots = asyncio.Semaphore(PARSE_WORKERS * 2)
+    progress = {"files": 0, "docs": 0}
+    report_every = max(1, len(changed) // 10)
+
+    async def parse(file_key: str):
+        async with slots:
+            documents = await loop.run_in_executor(pool, load_file, file_key)
+            for doc in documents:
+                doc.metadata = {**doc.metadata, **metadata}
+            progress["files"] += 1
+            progress["docs"] += len(documents)
+            if log_item and progress["files"] % report_every == 0:
+                log_item.stream(
+                    progress=f"\nParsed {progress['files']}/{len(changed)} files"
+                )
+            if queue:
+                await queue.put((file_key, documents))
+            else:
+                index[file_key]["documents"] = documents
 
-    # Mapping file extensions to corresponding loader classes
-    file_types_loaders = {
-        "txt": TextLoader,
-        "pdf": PyPDFLoader,
-        "csv": CSVLoader,
-        "html": UnstructuredHTMLLoader,
-        # "json": JSONLoader,
-        "json": TextLoader,
-        # "md": UnstructuredMarkdownLoader,
-        "md": TextLoader,
-    }
+    await asyncio.gather(*[parse(file_key) for file_key in changed])
 
-    cnt_files = 0
-    cnt_docs = 0
+    PrintStyle.standard(
+        f"Processed {progress['docs']} documents from {progress['files']} files."
+    )
+    if log_item:
+        log_item.stream(
+            progress=f"\nProcessed {progress['docs']} documents from {progress['files']} files."
+        )
+    return index
 
-    # for area in Memory.Area:
-    #     subdir = files.get_abs_path(knowledge_dir, area.value)
 
-    # if not os.path.exists(knowledge_dir):
-    #     os.makedirs(knowledge_dir)
-    #     continue
+def mark_removed(index: Dict[str, KnowledgeImport]) -> Dict[str, KnowledgeImport]:
+    # loop index where state is not set and mark it as removed
+    for file_key, file_data in index.items():
+        if not file_data.get("state", ""):
+            index[file_key]["state"] = "removed"
+    return index
 
-    # Fetch all files in the directory with specified extensions
-    kn_files = glob.glob(knowledge_dir + "/" + filename_pattern, recursive=True)
-    kn_files = [f for f in kn_files if os.path.isfile(f)]
 
-    if kn_files:
-        PrintStyle.standard(
-            f"Found {len(kn_files)} knowledge files in {knowledge_dir}, processing..."
-        )
-        if log_item:
-            log_item.stream(
-                progress=f"\nFound {len(kn_files)} knowledge files in {knowledge_dir}, processing...",
-            )
+def _scan_files(
+    knowledge_dir: str, index: Dict[str, KnowledgeImport], filename_pattern: str
+) -> list[str]:
+    kn_files = glob.glob(knowledge_dir + "/" + filename_pattern, recursive=True)
 
+    changed = []
     for file_path in kn_files:
         ext = file_path.split(".")[-1].lower()
-        if ext in file_types_loaders:
+        if ext not in file_types_loaders or not os.path.isfile(file_path):
+            continue
+        stat = os.stat(file_path)
+        file_key = file_path  # os.path.relpath(file_path, knowledge_dir)
+
+        # Load existing data from the index or create a new entry
+        file_data = index.get(file_key, {})
+
+        if (
+            file_data.get("size") == stat.st_size
+            and file_data.get("mtime") == stat.st_mtime_ns
+        ):
+            file_data["state"] = "original"
+        else:
             checksum = calculate_checksum(file_path)
-            file_key = file_path  # os.path.relpath(file_path, knowledge_dir)
-
-            # Load existing data from the index or create a new entry
-            file_data = index.get(file_key, {})
-
             if file_data.get("checksum") == checksum:
                 file_data["state"] = "original"
             else:
                 file_data["state"] = "changed"
-
-            if file_data["state"] == "changed":
                 file_data["checksum"] = checksum
-                loader_cls = file_types_loaders[ext]
-                loader = loader_cls(
-                    file_path,
-                    **(
-                        text_loader_kwargs
-                        if ext in ["txt", "csv", "html", "md"]
-                        else {}
-                    ),
-                )
-                file_data["documents"] = loader.load_and_split()
-                for doc in file_data["documents"]:
-                    doc.metadata = {**doc.metadata, **metadata}
-                cnt_files += 1
-                cnt_docs += len(file_data["documents"])
-                # PrintStyle.standard(f"Imported {len(file_data['documents'])} documents from {file_path}")
+                changed.append(file_key)
+            file_data["size"] = stat.st_size
+            file_data["mtime"] = stat.st_mtime_ns
 
-            # Update the index
-            index[file_key] = file_data  # type: ignore
+        # Update the index
+        index[file_key] = file_data  # type: ignore
+    return changed
 
-    # loop index where state is not set and mark it as removed
-    for file_key, file_data in index.items():
-        if not file_data.get("state", ""):
-            index[file_key]["state"] = "removed"
 
-    PrintStyle.standard(f"Processed {cnt_docs} documents from {cnt_files} files.")
-    if log_item:
-        log_item.stream(
-            progress=f"\nProcessed {cnt_docs} documents from {cnt_files} files."
+def _get_parse_pool() -> ProcessPoolExecutor:
+    global _parse_pool
+    if _parse_pool is None:
+        # spawned workers do not inherit locks held by the threads of this process
+        _parse_pool = ProcessPoolExecutor(
+            max_workers=PARSE_WORKERS, mp_context=multiprocessing.get_context("spawn")
         )
-    return index
+    return _parse_pool
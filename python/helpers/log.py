@@ -1,8 +1,10 @@
 from dataclasses import dataclass, field
 import json
 from typing import Any, Literal, Optional, Dict
+import threading
 import uuid
 from collections import OrderedDict  # Import OrderedDict
+from python.helpers import changes
 
 Type = Literal[
     "agent",
@@ -35,6 +37,8 @@ class LogItem:
     kvps: Optional[OrderedDict] = None  # Use OrderedDict for kvps
     id: Optional[str] = None  # Add id field
     guid: str = ""
+    # field ("heading", "content", "kvps.<key>") -> log version of its last change other than an append
+    rewrites: dict[str, int] = field(default_factory=dict)
 
     def __post_init__(self):
         self.guid = self.log.guid
@@ -76,8 +80,8 @@ class LogItem:
             prev = self.kvps.get(k, "") if self.kvps else ""
             self.update(**{k: prev + v})
 
-    def output(self):
-        return {
+    def output(self, start: int = 0, lengths: dict[str, int] | None = None):
+        out = {
             "no": self.no,
             "id": self.id,  # Include id in output
             "type": self.type,
@@ -87,13 +91,41 @@ class LogItem:
             "kvps": self.kvps,
         }
 
+        # string fields the client knows up to a length and that were only appended to
+        # since version start are sent as the appended suffix
+        if lengths:
+            appended = []
+            kvps = dict(self.kvps or {})
+            for key, length in lengths.items():
+                target, name = (kvps, key[5:]) if key.startswith("kvps.") else (out, key)
+                value = target.get(name)
+                if (
+                    isinstance(value, str)
+                    and isinstance(length, int)
+                    and 0 <= length <= len(value)
+                    and self.rewrites.get(key, -1) < start
+                ):
+                    target[name] = value[length:]
+                    appended.append(key)
+            if appended:
+                out["kvps"] = kvps
+                out["appended"] = appended
+        return out
+
+    def _track_rewrite(self, key: str, old: Any, new: Any):
+        if not (isinstance(old, str) and isinstance(new, str) and new.startswith(old)):
+            self.rewrites[key] = self.log.version
+
 
 class Log:
 
     def __init__(self):
         self.guid: str = str(uuid.uuid4())
-        self.updates: list[int] = []
+        self.version: int = 0  # incremented with every change of an item
+        # item no -> version of its last change, least recently changed first
+        self.updates: OrderedDict[int, int] = OrderedDict()
         self.logs: list[LogItem] = []
+        self._lock = threading.Lock()  # updates are written by agents and read by polls
         self.set_initial_progress()
 
     def log(
@@ -124,7 +156,7 @@ class Log:
             id=id,  # Pass id to LogItem
         )
         self.logs.append(item)
-        self.updates += [item.no]
+        self.mark_updated(item.no)
         self._update_progress_from_item(item)
         return item
 
@@ -145,10 +177,14 @@ class Log:
         if update_progress is not None:
             item.update_progress = update_progress
         if heading is not None:
+            item._track_rewrite("heading", item.heading, heading)
             item.heading = heading
         if content is not None:
+            item._track_rewrite("content", item.content, content)
             item.content = content
         if kvps is not None:
+            for k, v in kvps.items():
+                item._track_rewrite(f"kvps.{k}", (item.kvps or {}).get(k), v)
             item.kvps = OrderedDict(kvps)  # Use OrderedDict to keep the order
 
         if temp is not None:
@@ -158,9 +194,10 @@ class Log:
             if item.kvps is None:
                 item.kvps = OrderedDict()  # Ensure kvps is an OrderedDict
             for k, v in kwargs.items():
+                item._track_rewrite(f"kvps.{k}", item.kvps.get(k), v)
                 item.kvps[k] = v
 
-        self.updates += [item.no]
+        self.mark_updated(item.no)
         self._update_progress_from_item(item)
 
     def set_progress(self, progress: str, no: int = 0, active: bool = True):
@@ -169,28 +206,43 @@ class Log:
             no = len(self.logs)
         self.progress_no = no
         self.progress_active = active
+        changes.notify()
 
     def set_initial_progress(self):
         self.set_progress("Waiting for input", 0, False)
 
-    def output(self, start=None, end=None):
+    def mark_updated(self, no: int):
+        # only the last change of an item is kept, so the journal never outgrows the log
+        with self._lock:
+            self.updates[no] = self.version
+            self.updates.move_to_end(no)
+            self.version += 1
+        changes.notify()
+
+    def output(self, start=None, lengths: dict[str, dict[str, int]] | None = None):
         if start is None:
             start = 0
-        if end is None:
-            end = len(self.updates)
+        if lengths is None:
+            lengths = {}
 
-        out = []
-        seen = set()
-        for update in self.updates[start:end]:
-            if update not in seen:
-                out.append(self.logs[update].output())
-                seen.add(update)
+        # walk back from the most recent change, cost depends on changed items only
+        changed = []
+        with self._lock:
+            for no, version in reversed(self.updates.items()):
+                if version < start:
+                    break
+                changed.append(no)
 
-        return out
+        return [
+            self.logs[no].output(start, lengths.get(str(no)))
+            for no in sorted(changed)
+        ]
 
     def reset(self):
         self.guid = str(uuid.uuid4())
-        self.updates = []
+        with self._lock:
+            self.version = 0
+            self.updates = OrderedDict()
         self.logs = []
         self.set_initial_progress()
 
@@ -0,0 +1,115 @@
+import os
+import threading
+from datetime import datetime
+from typing import Callable
+
+
+class LogWriter:
+    """Appends text to a log file from a background thread.
+
+    Writes are buffered in memory and flushed every flush_interval seconds or once
+    flush_size characters are pending, so writers never wait for the disk.
+    When the file grows over max_size a new one is started, footer and header
+    close and open each file.
+    """
+
+    def __init__(
+        self,
+        folder: str,
+        extension: str,
+        header: str = "",
+        footer: str = "",
+        max_size: int = 10 * 1024 * 1024,
+        flush_interval: float = 0.5,
+        flush_size: int = 64 * 1024,
+        on_rotate: Callable[[str], None] | None = None,
+    ):
+        self.folder = folder
+        self.extension = extension
+        self.header = header
+        self.footer = footer
+        self.max_size = max_size
+        self.flush_interval = flush_interval
+        self.flush_size = flush_size
+        self.on_rotate = on_rotate
+        self.path = self._new_path()
+
+        self._buffer: list[str] = []
+        self._buffered = 0
+        self._closed = False
+        self._condition = threading.Condition()
+        self._file = None
+        self._open(self.path)
+        self._thread = threading.Thread(target=self._run, name="LogWriter", daemon=True)
+        self._thread.start()
+
+    def write(self, text: str):
+        with self._condition:
+            if self._closed:
+                return
+            self._buffer.append(text)
+            self._buffered += len(text)
+            if len(self._buffer) == 1 or self._buffered >= self.flush_size:
+                self._condition.notify_all()
+
+    def close(self):
+        with self._condition:
+            if self._closed:
+                return
+            self._closed = True
+            self._condition.notify_all()
+        self._thread.join(5)
+
+    def _run(self):
+        while True:
+            with self._condition:
+                # idle until something is written, then collect more for up to flush_interval
+                self._condition.wait_for(lambda: self._closed or bool(self._buffer))
+                self._condition.wait_for(
+                    lambda: self._closed or self._buffered >= self.flush_size,
+                    self.flush_interval,
+                )
+                text = "".join(self._buffer)
+                self._buffer.clear()
+                self._buffered = 0
+                closed = self._closed
+
+            try:
+                if text:
+                    self._write(text)
+                if closed:
+                    self._file.write(self.footer)  # type: ignore
+                    self._file.close()  # type: ignore
+            except Exception as e:
+                # logging must never break the program, report and keep going
+                print(f"Error writing log file {self.path}: {e}")
+
+            if closed:
+                return
+
+    def _write(self, text: str):
+        self._file.write(text)  # type: ignore
+        self._file.flush()  # type: ignore
+        if self._file.tell() >= self.max_size:  # type: ignore
+            self._file.write(self.footer)  # type: ignore
+            self._file.close()  # type: ignore
+            self.path = self._new_path()
+            self._open(self.path)
+            if self.on_rotate:
+                self.on_rotate(self.path)
+
+    def _open(self, path: str):
+        self._file = open(path, "a", encoding="utf-8")
+        self._file.write(self.header)
+        self._file.flush()
+
+    def _new_path(self) -> str:
+        os.makedirs(self.folder, exist_ok=True)
+        name = datetime.now().strftime("log_%Y%m%d_%H%M%S")
+        path = os.path.join(self.folder, name + self.extension)
+        # rotation can start more than one file per second
+        no = 1
+        while os.path.exists(path):
+            path = os.path.join(self.folder, f"{name}_{no}{self.extension}")
+            no += 1
+        return path
@@ -0,0 +1,184 @@
+import os
+import sys
+import threading
+import time
+import traceback
+from dataclasses import dataclass, field
+from typing import Any
+
+from python.helpers import files
+from python.helpers.defer import EventLoopThread
+from python.helpers.print_style import PrintStyle
+
+CHECK_INTERVAL = 0.05  # seconds between checks of the loops
+BLOCK_THRESHOLD = 0.25  # seconds a loop may be blocked before its stack is sampled
+STACK_DEPTH = 15  # frames kept for each offender
+MAX_OFFENDERS = 100  # locations kept, the ones blocking the least are dropped
+
+# frames of these files are never blamed, they only run what blocks
+_IGNORED_FILES = (
+    os.path.join("python", "helpers", "defer.py"),
+    os.path.join("python", "helpers", "loop_monitor.py"),
+)
+
+
+@dataclass
+class Offender:
+    location: str  # first frame in the project's code, file:line in function
+    count: int = 0  # times it blocked a loop
+    seconds: float = 0.0  # total time blocked
+    max_seconds: float = 0.0
+    last_seen: float = 0.0
+    loop: str = ""
+    stack: list[str] = field(default_factory=list)
+
+
+@dataclass
+class _Episode:
+    # a loop blocked right now, stacks are sampled until it runs again
+    blocked: float = 0.0
+    samples: dict[str, int] = field(default_factory=dict)  # location -> samples
+    stacks: dict[str, list[str]] = field(default_factory=dict)
+
+
+_lock = threading.Lock()
+_offenders: dict[str, Offender] = {}
+_episodes: dict[str, _Episode] = {}  # thread name -> current episode
+_thread: threading.Thread | None = None
+
+
+def start():
+    """Start watching all event loop threads for blocking calls."""
+    global _thread
+    with _lock:
+        if _thread:
+            return
+        _thread = threading.Thread(target=_run, name="LoopMonitor", daemon=True)
+        _thread.start()
+
+
+def get_report(limit: int = 20) -> dict[str, Any]:
+    """Current lag of each loop and the locations that blocked loops the longest."""
+    loops = [
+        {
+            "name": thread.thread_name,
+            "lag": round(thread.get_lag(), 3),
+            "blocked": round(thread.get_blocked(), 3),
+        }
+        for thread in _get_threads()
+    ]
+    with _lock:
+        offenders = sorted(_offenders.values(), key=lambda o: o.seconds, reverse=True)
+        return {
+            "threshold": BLOCK_THRESHOLD,
+            "loops": sorted(loops, key=lambda l: l["name"]),
+            "offenders": [
+                {
+                    "location": o.location,
+                    "count": o.count,
+                    "seconds": round(o.seconds, 3),
+                    "max_seconds": round(o.max_seconds, 3),
+                    "last_seen": o.last_seen,
+                    "loop": o.loop,
+                    "stack": o.stack,
+                }
+                for o in offenders[:limit]
+            ],
+        }
+
+
+def reset():
+    with _lock:
+        _offenders.clear()
+
+
+def _run():
+    while True:
+        time.sleep(CHECK_INTERVAL)
+        try:
+            _check()
+        except Exception as e:
+            # the monitor must never stop, report and keep watching
+            PrintStyle.error(f"Loop monitor: {e}")
+
+
+def _check():
+    threads = _get_threads()
+    frames = None
+    for thread in threads:
+        name = thread.thread_name
+        blocked = thread.get_blocked()
+        episode = _episodes.get(name)
+
+        if blocked <= BLOCK_THRESHOLD:
+            if episode:
+                del _episodes[name]
+                # the heartbeat that just ran measured the whole block
+                _report(name, episode, max(episode.blocked, thread.lag))
+            continue
+
+        if not thread.thread or not thread.thread.ident:
+            continue
+        if frames is None:
+            frames = sys._current_frames()
+        frame = frames.get(thread.thread.ident)
+        if frame is None:
+            continue
+
+        episode = _episodes.setdefault(name, _Episode())
+        episode.blocked = blocked
+        location, stack = _get_location(frame)
+        episode.samples[location] = episode.samples.get(location, 0) + 1
+        episode.stacks[location] = stack
+
+    # loops that were terminated
+    for name in set(_episodes) - {t.thread_name for t in threads}:
+        del _episodes[name]
+
+
+def _report(loop: str, episode: _Episode, seconds: float):
+    # the whole block is blamed on the location seen in most samples
+    location = max(episode.samples, key=lambda l: episode.samples[l])
+    with _lock:
+        offender = _offenders.get(location)
+        if offender is None:
+            if len(_offenders) >= MAX_OFFENDERS:
+                least = min(_offenders.values(), key=lambda o: o.seconds)
+                del _offenders[least.location]
+            offender = _offenders[location] = Offender(location)
+        offender.count += 1
+        offender.seconds += seconds
+        offender.max_seconds = max(offender.max_seconds, seconds)
+        offender.last_seen = time.time()
+        offender.loop = loop
+        offender.stack = episode.stacks[location]
+    PrintStyle.warning(f"Event loop {loop} was blocked for {seconds:.2f}s at {location}")
+
+
+def _get_location(frame) -> tuple[str, list[str]]:
+    base = files.get_base_dir()
+    summary = traceback.extract_stack(frame)[-STACK_DEPTH:]
+    stack = [
+        f"{_get_path(f.filename, base)}:{f.lineno} in {f.name}: {(f.line or '').strip()}"
+        for f in summary
+    ]
+    # innermost frame of the project's own code, libraries are where it blocks but not why
+    for f in reversed(summary):
+        path = _get_path(f.filename, base)
+        if path != f.filename and "site-packages" not in path and path not in _IGNORED_FILES:
+            return f"{path}:{f.lineno} in {f.name}", stack
+    f = summary[-1]
+    return f"{_get_path(f.filename, base)}:{f.lineno} in {f.name}", stack
+
+
+def _get_path(filename: str, base: str) -> str:
+    # relative to the project, other files stay absolute
+    if filename.startswith(base + os.sep):
+        return os.path.relpath(filename, base)
+    return filename
+
+
+def _get_threads() -> list[EventLoopThread]:
+    with EventLoopThread._lock:
+        threads = list(EventLoopThread._instances.values())
+    return [t for t in threads if t.loop and t.thread]
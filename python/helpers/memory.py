@@ -12,7 +12,7 @@ from langchain_community.vectorstores.utils import (
 )
 from langchain_core.embeddings import Embeddings
 
-import os, json
+import os, json, asyncio, math, operator, threading, traceback
 
 import numpy as np
 
@@ -20,7 +20,10 @@ from python.helpers.print_style import PrintStyle
 from . import files
 from langchain_core.documents import Document
 import uuid
-from python.helpers import knowledge_import
+from python.helpers import knowledge_import, settings
+from python.helpers.memory_journal import MemoryJournal, SNAPSHOT_FILE, fsync_file
+from python.helpers.embedding_batcher import EmbeddingBatcher
+from python.helpers.memory_filter import MetadataFilter, MetadataIndex, get_filter
 from python.helpers.log import Log, LogItem
 from enum import Enum
 from agent import Agent, ModelConfig
@@ -39,6 +42,178 @@ class MyFaiss(FAISS):
     def get_all_docs(self):
         return self.docstore._dict  # type: ignore
 
+    # metadata of documents and index positions of their vectors, built lazily for filtered search
+    _metadata_index: MetadataIndex | None = None
+    _positions: dict[str, int] | None = None
+    # held by searches in worker threads and by changes, set to the lock of the memory subdir
+    lock: threading.RLock = threading.RLock()
+
+    def get_tombstone_count(self) -> int:
+        # vectors of deleted documents still present in the index
+        return self.index.ntotal - len(self.get_all_docs())
+
+    def get_metadata_index(self) -> MetadataIndex:
+        if self._metadata_index is None:
+            self._metadata_index = MetadataIndex()
+            for id, doc in self.get_all_docs().items():
+                self._metadata_index.add(id, doc.metadata)
+        return self._metadata_index
+
+    def get_positions(self) -> dict[str, int]:
+        if self._positions is None:
+            self._positions = {id: i for i, id in self.index_to_docstore_id.items()}
+        return self._positions
+
+    def set_index(self, index: faiss.Index, index_to_docstore_id: dict[int, str]):
+        self.index = index
+        self.index_to_docstore_id = index_to_docstore_id
+        self._positions = None
+
+    def add_texts(self, texts, metadatas=None, ids=None, **kwargs) -> List[str]:
+        start = len(self.index_to_docstore_id)
+        return self._on_added(start, super().add_texts(texts, metadatas, ids, **kwargs))
+
+    async def aadd_texts(self, texts, metadatas=None, ids=None, **kwargs) -> List[str]:
+        start = len(self.index_to_docstore_id)
+        return self._on_added(
+            start, await super().aadd_texts(texts, metadatas, ids, **kwargs)
+        )
+
+    def add_embeddings(self, text_embeddings, metadatas=None, ids=None, **kwargs) -> List[str]:
+        start = len(self.index_to_docstore_id)
+        return self._on_added(
+            start, super().add_embeddings(text_embeddings, metadatas, ids, **kwargs)
+        )
+
+    def _on_added(self, start: int, ids: List[str]) -> List[str]:
+        # new vectors are appended, keep lazily built lookups up to date
+        docs = self.get_all_docs()
+        for j, id in enumerate(ids):
+            if self._positions is not None:
+                self._positions[id] = start + j
+            if self._metadata_index is not None:
+                self._metadata_index.add(id, docs[id].metadata)
+        return ids
+
+    def delete(self, ids: list[str] | None = None, **kwargs) -> bool | None:
+        if self._metadata_index is not None and ids is not None:
+            docs = self.get_all_docs()
+            for id in ids:
+                if id in docs:
+                    self._metadata_index.remove(id, docs[id].metadata)
+
+        if Memory.get_index_type(self.index) == "flat":
+            # langchain compacts the positions of remaining vectors
+            self._positions = None
+            return super().delete(ids, **kwargs)
+
+        # approximate indexes can not remove vectors and keep positions consistent,
+        # documents are removed from the docstore only and their vectors skipped in search
+        if ids is None:
+            raise ValueError("No ids provided to delete.")
+        missing_ids = set(ids).difference(self.get_all_docs())
+        if missing_ids:
+            raise ValueError(
+                f"Some specified ids do not exist in the current store. Ids not found: {missing_ids}"
+            )
+        self.docstore.delete(ids)
+        return True
+
+    def similarity_search_with_score_by_vector(
+        self,
+        embedding: List[float],
+        k: int = 4,
+        filter: Any = None,
+        fetch_k: int = 20,
+        **kwargs: Any,
+    ) -> List[tuple[Document, float]]:
+        # searches run in worker threads, the lazily built lookups and the index
+        # must not change meanwhile
+        with self.lock:
+            return self._similarity_search_with_score_by_vector(
+                embedding, k, filter, fetch_k, **kwargs
+            )
+
+    def _similarity_search_with_score_by_vector(
+        self,
+        embedding: List[float],
+        k: int = 4,
+        filter: Any = None,
+        fetch_k: int = 20,
+        **kwargs: Any,
+    ) -> List[tuple[Document, float]]:
+        vector = np.array([embedding], dtype=np.float32)
+        if self._normalize_L2:
+            faiss.normalize_L2(vector)
+
+        selection, exact = None, False
+        if isinstance(filter, MetadataFilter):
+            # narrow the search down to matching documents inside the index
+            selection, exact = filter.select(self.get_metadata_index())
+            if selection is not None and not selection:
+                return []
+
+        if selection is None:
+            # fetch more results to make up for deleted documents
+            fetch = (k if filter is None else fetch_k) + self.get_tombstone_count()
+            params = None
+        else:
+            # selected documents are all live, only inexact selections need post filtering
+            fetch = k if exact else fetch_k
+            positions = self.get_positions()
+            params = self._get_search_params([positions[id] for id in selection])
+        scores, indices = self.index.search(
+            vector, max(1, min(fetch, self.index.ntotal)), params=params
+        )
+
+        filter_func = self._create_filter_func(filter) if filter is not None else None
+        docs = []
+        for j, i in enumerate(indices[0]):
+            if i == -1:
+                continue
+            doc = self.get_all_docs().get(self.index_to_docstore_id.get(i))
+            if doc is None:
+                continue  # deleted
+            if filter_func is None or filter_func(doc.metadata):
+                docs.append((doc, float(scores[0][j])))
+
+        score_threshold = kwargs.get("score_threshold")
+        if score_threshold is not None:
+            cmp = (
+                operator.ge
+                if self.distance_strategy
+                in (DistanceStrategy.MAX_INNER_PRODUCT, DistanceStrategy.JACCARD)
+                else operator.le
+            )
+            docs = [(doc, score) for doc, score in docs if cmp(score, score_threshold)]
+        return docs[:k]
+
+    def _get_search_params(self, positions: list[int]) -> faiss.SearchParameters:
+        selector = faiss.IDSelectorBatch(np.array(positions, dtype=np.int64))
+        index = faiss.downcast_index(self.index)
+        if isinstance(index, faiss.IndexHNSW):
+            return faiss.SearchParametersHNSW(sel=selector, efSearch=index.hnsw.efSearch)
+        if isinstance(index, faiss.IndexIVF):
+            return faiss.SearchParametersIVF(sel=selector, nprobe=index.nprobe)
+        return faiss.SearchParameters(sel=selector)
+
+    async def asimilarity_search_with_score_by_vector(
+        self,
+        embedding: List[float],
+        k: int = 4,
+        filter: Any = None,
+        fetch_k: int = 20,
+        **kwargs: Any,
+    ) -> List[tuple[Document, float]]:
+        return await asyncio.to_thread(
+            self.similarity_search_with_score_by_vector,
+            embedding,
+            k,
+            filter,
+            fetch_k,
+            **kwargs,
+        )
+
 
 class Memory:
 
@@ -48,50 +223,82 @@ class Memory:
         SOLUTIONS = "solutions"
         INSTRUMENTS = "instruments"
 
-    index: dict[str, "MyFaiss"] = {}
+    index: dict[str, dict[str, "MyFaiss"]] = {}  # memory subdir -> area -> database
+    journals: dict[str, MemoryJournal] = {}
+    _compacting: dict[str, asyncio.Task] = {}
+    # contexts run on several event loop threads, the databases of a memory subdir
+    # are initialized and changed under its lock
+    _locks: dict[str, threading.RLock] = {}
+    _locks_lock = threading.Lock()
+
+    # number of journal entries after which the snapshot is rewritten in background
+    JOURNAL_COMPACT_OPS = 500
+
+    # knowledge import, parsed files waiting for embedding and documents embedded at once
+    KNOWLEDGE_QUEUE_SIZE = 32
+    KNOWLEDGE_EMBED_BATCH = 256
+
+    # automatic index selection by number of vectors
+    INDEX_TYPES = ["flat", "hnsw", "ivf", "ivfpq"]
+    INDEX_AUTO_HNSW_SIZE = 20_000
+    INDEX_AUTO_IVF_SIZE = 200_000
+    INDEX_AUTO_HYSTERESIS = 0.8  # migrate back only well below the threshold
+    # share of deleted vectors after which an approximate index is rebuilt
+    INDEX_TOMBSTONE_RATIO = 0.25
+    # IVF clusters need enough vectors to be trained on
+    IVF_MIN_TRAIN_SIZE = 10_000
+    HNSW_M = 32
+    HNSW_EF_SEARCH = 64
+    IVF_NPROBE = 16
 
     @staticmethod
     async def get(agent: Agent):
         memory_subdir = agent.config.memory_subdir or "default"
-        if Memory.index.get(memory_subdir) is None:
-            log_item = agent.context.log.log(
-                type="util",
-                heading=f"Initializing VectorDB in '/{memory_subdir}'",
-            )
-            db, created = Memory.initialize(
-                log_item,
-                agent.config.embeddings_model,
-                memory_subdir,
-                False,
-            )
-            Memory.index[memory_subdir] = db
-            wrap = Memory(agent, db, memory_subdir=memory_subdir)
-            if agent.config.knowledge_subdirs:
-                await wrap.preload_knowledge(
-                    log_item, agent.config.knowledge_subdirs, memory_subdir
+        log_item = None
+        with Memory.get_lock(memory_subdir):
+            dbs = Memory.index.get(memory_subdir)
+            if dbs is None:
+                log_item = agent.context.log.log(
+                    type="util",
+                    heading=f"Initializing VectorDB in '/{memory_subdir}'",
                 )
-            return wrap
-        else:
-            return Memory(
-                agent=agent,
-                db=Memory.index[memory_subdir],
-                memory_subdir=memory_subdir,
+                dbs, created = Memory.initialize(
+                    log_item,
+                    agent.config.embeddings_model,
+                    memory_subdir,
+                    False,
+                )
+                Memory.index[memory_subdir] = dbs
+        wrap = Memory(agent=agent, dbs=dbs, memory_subdir=memory_subdir)
+        if log_item and agent.config.knowledge_subdirs:
+            await wrap.preload_knowledge(
+                log_item, agent.config.knowledge_subdirs, memory_subdir
             )
+        return wrap
 
     @staticmethod
     async def reload(agent: Agent):
         memory_subdir = agent.config.memory_subdir or "default"
-        if Memory.index.get(memory_subdir):
-            del Memory.index[memory_subdir]
+        with Memory.get_lock(memory_subdir):
+            Memory.index.pop(memory_subdir, None)
         return await Memory.get(agent)
 
+    @staticmethod
+    def get_lock(memory_subdir: str) -> threading.RLock:
+        # the areas of a memory subdir share the lock of the subdir
+        key = memory_subdir.split("/")[0]
+        with Memory._locks_lock:
+            if key not in Memory._locks:
+                Memory._locks[key] = threading.RLock()
+            return Memory._locks[key]
+
     @staticmethod
     def initialize(
         log_item: LogItem | None,
         model_config: ModelConfig,
         memory_subdir: str,
         in_memory=False,
-    ) -> tuple[MyFaiss, bool]:
+    ) -> tuple[dict[str, MyFaiss], bool]:
 
         PrintStyle.standard("Initializing VectorDB...")
 
@@ -112,82 +319,77 @@ class Memory:
             os.makedirs(em_dir, exist_ok=True)
             store = LocalFileStore(em_dir)
 
-        embeddings_model = models.get_model(
-            models.ModelType.EMBEDDING,
-            model_config.provider,
-            model_config.name,
-            **model_config.kwargs,
+        # shared instance, dimension known without calling the model
+        embeddings_model = models.get_embedding_model(
+            model_config.provider, model_config.name, **model_config.kwargs
+        )
+        dim = models.get_embedding_dimension(
+            model_config.provider, model_config.name, **model_config.kwargs
         )
         embeddings_model_id = files.safe_file_name(
             model_config.provider.name + "_" + model_config.name
         )
 
-        # here we setup the embeddings model with the chosen cache storage
-        embedder = CacheBackedEmbeddings.from_bytes_store(
-            embeddings_model, store, namespace=embeddings_model_id
-        )
-
-        # initial DB and docs variables
-        db: MyFaiss | None = None
-        docs: dict[str, Document] | None = None
-
-        created = False
-
-        # if db folder exists and is not empty:
-        if os.path.exists(db_dir) and files.exists(db_dir, "index.faiss"):
-            db = MyFaiss.load_local(
-                folder_path=db_dir,
-                embeddings=embedder,
-                allow_dangerous_deserialization=True,
-                distance_strategy=DistanceStrategy.COSINE,
-                # normalize_L2=True,
-                relevance_score_fn=Memory._cosine_normalizer,
-            )  # type: ignore
-
-            # if there is a mismatch in embeddings used, re-index the whole DB
-            emb_ok = False
-            emb_set_file = files.get_abs_path(db_dir, "embedding.json")
-            if files.exists(emb_set_file):
-                embedding_set = json.loads(files.read_file(emb_set_file))
-                if (
-                    embedding_set["model_provider"] == model_config.provider.name
-                    and embedding_set["model_name"] == model_config.name
-                ):
-                    # model matches
-                    emb_ok = True
-
-            # re-index -  create new DB and insert existing docs
-            if db and not emb_ok:
-                docs = db.get_all_docs()
-                db = None
-
-        # DB not loaded, create one
-        if not db:
-            index = faiss.IndexFlatIP(len(embedder.embed_query("example")))
-
-            db = MyFaiss(
-                embedding_function=embedder,
-                index=index,
-                docstore=InMemoryDocstore(),
-                index_to_docstore_id={},
-                distance_strategy=DistanceStrategy.COSINE,
-                # normalize_L2=True,
-                relevance_score_fn=Memory._cosine_normalizer,
+        # here we setup the embeddings model with the chosen cache storage,
+        # concurrent requests of all contexts are batched
+        embedder = EmbeddingBatcher(
+            CacheBackedEmbeddings.from_bytes_store(
+                embeddings_model, store, namespace=embeddings_model_id
             )
+        )
 
-            # insert docs if reindexing
+        # every area is a separate database in its own subfolder
+        dbs: dict[str, MyFaiss] = {}
+        for area in Memory._list_areas(db_dir):
+            db = Memory._load_db(embedder, f"{memory_subdir}/{area}")
+            if db:
+                dbs[area] = db
+
+        # databases from before sharding hold all areas in one index, split it up
+        legacy_db = Memory._load_db(embedder, memory_subdir)
+        if legacy_db:
+            PrintStyle.standard("Splitting memory index by area...")
+            if log_item:
+                log_item.stream(progress="\nSplitting memory index by area")
+            for area, db in Memory._split_db(legacy_db, memory_subdir).items():
+                Memory._save_db_file(db, f"{memory_subdir}/{area}")
+                dbs[area] = db
+            Memory.journals.pop(memory_subdir).remove_files()
+
+        created = not dbs
+
+        # if there is a mismatch in embeddings used, re-index all areas
+        emb_ok = False
+        emb_set_file = files.get_abs_path(db_dir, "embedding.json")
+        if files.exists(emb_set_file):
+            embedding_set = json.loads(files.read_file(emb_set_file))
+            if (
+                embedding_set["model_provider"] == model_config.provider.name
+                and embedding_set["model_name"] == model_config.name
+            ):
+                # model matches
+                emb_ok = True
+
+        if not emb_ok:
+            docs = {id: doc for db in dbs.values() for id, doc in db.get_all_docs().items()}
+            groups = Memory._group_by_area(docs)
             if docs:
                 PrintStyle.standard("Indexing memories...")
                 if log_item:
                     log_item.stream(progress="\nIndexing memories")
-                db.add_documents(documents=list(docs.values()), ids=list(docs.keys()))
+            # areas left empty are rewritten too, so that no vectors of the old model remain
+            for area in set(dbs) | set(groups):
+                db = Memory._create_db(embedder, dim, f"{memory_subdir}/{area}")
+                if area in groups:
+                    db.add_documents(
+                        documents=list(groups[area].values()), ids=list(groups[area])
+                    )
+                Memory._save_db_file(db, f"{memory_subdir}/{area}")
+                dbs[area] = db
 
-            # save DB
-            Memory._save_db_file(db, memory_subdir)
             # save meta file
-            meta_file_path = files.get_abs_path(db_dir, "embedding.json")
             files.write_file(
-                meta_file_path,
+                emb_set_file,
                 json.dumps(
                     {
                         "model_provider": model_config.provider.name,
@@ -196,19 +398,120 @@ class Memory:
                 ),
             )
 
-            created = True
+        for area, db in dbs.items():
+            # migrate to another index type if the size crossed a threshold or settings changed
+            index_type = Memory._get_wanted_index_type(db)
+            if index_type != Memory.get_index_type(db.index):
+                PrintStyle.standard(f"Migrating memory index of '{area}'...")
+                if log_item:
+                    log_item.stream(progress=f"\nMigrating memory index of '{area}'")
+                Memory._rebuild_db(db, index_type)
+                Memory._save_db_file(db, f"{memory_subdir}/{area}")
+
+        # built-in areas always exist, others are created with their first document
+        for area in Memory.Area:
+            if area.value not in dbs:
+                db = Memory._create_db(embedder, dim, f"{memory_subdir}/{area.value}")
+                Memory._save_db_file(db, f"{memory_subdir}/{area.value}")
+                dbs[area.value] = db
+
+        return dbs, created
+
+    @staticmethod
+    def _load_db(embedder: Embeddings, memory_subdir: str) -> MyFaiss | None:
+        db_dir = Memory._abs_db_dir(memory_subdir)
+        journal = MemoryJournal(db_dir)
+        index_name = journal.get_index_name()
+        if not files.exists(db_dir, index_name + ".faiss"):
+            return None
+        Memory.journals[memory_subdir] = journal
+
+        db = MyFaiss.load_local(
+            folder_path=db_dir,
+            embeddings=embedder,
+            index_name=index_name,
+            allow_dangerous_deserialization=True,
+            distance_strategy=DistanceStrategy.COSINE,
+            # normalize_L2=True,
+            relevance_score_fn=Memory._cosine_normalizer,
+        )  # type: ignore
+        db.lock = Memory.get_lock(memory_subdir)
+
+        # replay changes made after the snapshot was written
+        replayed = Memory._replay_journal(db, journal)
+        if replayed:
+            PrintStyle.standard(f"Replayed {replayed} memory journal entries")
+            Memory._save_db_file(db, memory_subdir)
+        return db
+
+    @staticmethod
+    def _create_db(embedder: Embeddings, dim: int, memory_subdir: str) -> MyFaiss:
+        if memory_subdir not in Memory.journals:
+            Memory.journals[memory_subdir] = MemoryJournal(
+                Memory._abs_db_dir(memory_subdir)
+            )
+        db = MyFaiss(
+            embedding_function=embedder,
+            index=faiss.IndexFlatIP(dim),
+            docstore=InMemoryDocstore(),
+            index_to_docstore_id={},
+            distance_strategy=DistanceStrategy.COSINE,
+            # normalize_L2=True,
+            relevance_score_fn=Memory._cosine_normalizer,
+        )
+        db.lock = Memory.get_lock(memory_subdir)
+        return db
+
+    @staticmethod
+    def _split_db(db: MyFaiss, memory_subdir: str) -> dict[str, MyFaiss]:
+        # move the vectors of each area to a database of its own
+        ids, vectors = Memory._get_live_vectors(db)
+        rows = {id: row for row, id in enumerate(ids)}
+        dbs: dict[str, MyFaiss] = {}
+        for area, docs in Memory._group_by_area(db.get_all_docs()).items():
+            area_db = Memory._create_db(
+                db.embedding_function, db.index.d, f"{memory_subdir}/{area}"  # type: ignore
+            )
+            area_db.add_embeddings(
+                text_embeddings=[
+                    (doc.page_content, vectors[rows[id]]) for id, doc in docs.items()
+                ],
+                metadatas=[doc.metadata for doc in docs.values()],
+                ids=list(docs),
+            )
+            dbs[area] = area_db
+        return dbs
 
-        return db, created
+    @staticmethod
+    def _list_areas(db_dir: str) -> list[str]:
+        return [
+            dir
+            for dir in os.listdir(db_dir)
+            if files.exists(db_dir, dir, SNAPSHOT_FILE)
+        ]
+
+    @staticmethod
+    def get_area(metadata: dict) -> str:
+        # area subfolder the document is stored in
+        return files.safe_file_name(str(metadata.get("area") or Memory.Area.MAIN.value))
+
+    @staticmethod
+    def _group_by_area(docs: dict[str, Document]) -> dict[str, dict[str, Document]]:
+        groups: dict[str, dict[str, Document]] = {}
+        for id, doc in docs.items():
+            groups.setdefault(Memory.get_area(doc.metadata), {})[id] = doc
+        return groups
 
     def __init__(
         self,
         agent: Agent,
-        db: MyFaiss,
+        dbs: dict[str, MyFaiss],
         memory_subdir: str,
     ):
         self.agent = agent
-        self.db = db
+        self.dbs = dbs
         self.memory_subdir = memory_subdir
+        self.lock = Memory.get_lock(memory_subdir)
 
     async def preload_knowledge(
         self, log_item: LogItem | None, kn_dirs: list[str], memory_subdir: str
@@ -231,20 +534,33 @@ class Memory:
             with open(index_path, "r") as f:
                 index = json.load(f)
 
-        # preload knowledge folders
-        index = self._preload_knowledge_folders(log_item, kn_dirs, index)
+        # preload knowledge folders, parsed files are embedded while parsing goes on
+        queue: asyncio.Queue = asyncio.Queue(maxsize=Memory.KNOWLEDGE_QUEUE_SIZE)
+        producer = asyncio.create_task(
+            self._preload_knowledge_folders(log_item, kn_dirs, index, queue)
+        )
+        consumer = asyncio.create_task(
+            self._insert_knowledge(log_item, queue, index)
+        )
+        done, _ = await asyncio.wait(
+            [producer, consumer], return_when=asyncio.FIRST_COMPLETED
+        )
+        if consumer in done:  # failed before all files were parsed
+            producer.cancel()
+            consumer.result()
+        try:
+            index = await producer
+        except BaseException:
+            consumer.cancel()
+            raise
+        await queue.put(None)
+        await consumer
 
         for file in index:
-            if index[file]["state"] in ["changed", "removed"] and index[file].get(
+            if index[file]["state"] == "removed" and index[file].get(
                 "ids", []
-            ):  # for knowledge files that have been changed or removed and have IDs
-                await self.delete_documents_by_ids(
-                    index[file]["ids"]
-                )  # remove original version
-            if index[file]["state"] == "changed":
-                index[file]["ids"] = await self.insert_documents(
-                    index[file]["documents"]
-                )  # insert new version
+            ):  # for knowledge files that have been removed and have IDs
+                await self.delete_documents_by_ids(index[file]["ids"])
 
         # remove index where state="removed"
         index = {k: v for k, v in index.items() if v["state"] != "removed"}
@@ -258,50 +574,133 @@ class Memory:
         with open(index_path, "w") as f:
             json.dump(index, f)
 
-    def _preload_knowledge_folders(
+    async def _preload_knowledge_folders(
         self,
         log_item: LogItem | None,
         kn_dirs: list[str],
         index: dict[str, knowledge_import.KnowledgeImport],
+        queue: asyncio.Queue,
     ):
         # load knowledge folders, subfolders by area
         for kn_dir in kn_dirs:
             for area in Memory.Area:
-                index = knowledge_import.load_knowledge(
+                index = await knowledge_import.load_knowledge(
                     log_item,
                     files.get_abs_path("knowledge", kn_dir, area.value),
                     index,
                     {"area": area.value},
+                    queue=queue,
                 )
 
         # load instruments descriptions
-        index = knowledge_import.load_knowledge(
+        index = await knowledge_import.load_knowledge(
             log_item,
             files.get_abs_path("instruments"),
             index,
             {"area": Memory.Area.INSTRUMENTS.value},
             filename_pattern="**/*.md",
+            queue=queue,
         )
 
-        return index
+        return knowledge_import.mark_removed(index)
+
+    async def _insert_knowledge(
+        self,
+        log_item: LogItem | None,
+        queue: asyncio.Queue,
+        index: dict[str, knowledge_import.KnowledgeImport],
+    ):
+        # documents of changed files come in from the queue until None,
+        # they are embedded in batches spanning multiple files
+        pending: list[tuple[str, list[Document]]] = []
+        count = 0
+        done = False
+        while not done:
+            item = await queue.get()
+            if item is None:
+                done = True
+            else:
+                file, docs = item
+                if index[file].get("ids", []):
+                    await self.delete_documents_by_ids(
+                        index[file]["ids"]
+                    )  # remove original version
+                index[file]["ids"] = []
+                pending.append((file, docs))
+
+            size = sum(len(docs) for _, docs in pending)
+            if pending and (
+                done or queue.empty() or size >= Memory.KNOWLEDGE_EMBED_BATCH
+            ):
+                ids = await self.insert_documents(
+                    [doc for _, docs in pending for doc in docs]
+                )  # insert new version
+                for file, docs in pending:
+                    index[file]["ids"], ids = ids[: len(docs)], ids[len(docs) :]
+                pending = []
+                count += size
+                if log_item and size:
+                    log_item.stream(progress=f"\nEmbedded {count} documents")
 
     async def search_similarity_threshold(
         self, query: str, limit: int, threshold: float, filter: str = ""
     ):
-        comparator = Memory._get_comparator(filter) if filter else None
+        comparator = get_filter(filter) if filter else None
+
+        # only search areas the filter can match
+        areas = comparator.get_values("area") if comparator else None
+        dbs = [
+            db
+            for area, db in self.dbs.items()
+            if areas is None or area in {Memory.get_area({"area": a}) for a in areas}
+        ]
+        if not dbs:
+            return []
 
         # rate limiter
         await self.agent.rate_limiter(
             model_config=self.agent.config.embeddings_model, input=query
         )
 
-        return await self.db.asearch(
-            query,
-            search_type="similarity_score_threshold",
-            k=limit,
-            score_threshold=threshold,
-            filter=comparator,
+        # embed once, search all areas in parallel and merge their top results
+        embedding = await dbs[0].embedding_function.aembed_query(query)  # type: ignore
+        results = await asyncio.gather(
+            *[
+                db.asimilarity_search_with_score_by_vector(
+                    embedding, k=limit, filter=comparator
+                )
+                for db in dbs
+            ]
         )
+        docs = [
+            (doc, Memory._cosine_normalizer(score))
+            for result in results
+            for doc, score in result
+        ]
+        docs = [(doc, score) for doc, score in docs if score >= threshold]
+        docs.sort(key=lambda item: item[1], reverse=True)
+        return [doc for doc, _ in docs[:limit]]
+
+    @staticmethod
+    def _replay_journal(db: MyFaiss, journal: MemoryJournal) -> int:
+        # entries are applied idempotently, a crash during compaction may leave
+        # a journal around that the new snapshot already contains
+        count = 0
+        for entry in journal.read():
+            if entry["op"] == "insert":
+                docs = [d for d in entry["docs"] if d["id"] not in db.get_all_docs()]
+                if docs:
+                    db.add_embeddings(
+                        text_embeddings=[(d["text"], d["embedding"]) for d in docs],
+                        metadatas=[d["metadata"] for d in docs],
+                        ids=[d["id"] for d in docs],
+                    )
+            elif entry["op"] == "delete":
+                ids = [id for id in entry["ids"] if id in db.get_all_docs()]
+                if ids:
+                    db.delete(ids=ids)
+            count += 1
+        return count
 
     async def delete_documents_by_query(
         self, query: str, threshold: float, filter: str = ""
@@ -326,28 +725,39 @@ class Memory:
                 # fnd = self.db.get(where={"id": {"$in": document_ids}})
                 # if fnd["ids"]: self.db.delete(ids=fnd["ids"])
                 # tot += len(fnd["ids"])
-                self.db.delete(ids=document_ids)
+                with self.lock:
+                    for area, ids in self._get_ids_by_area(document_ids).items():
+                        self.dbs[area].delete(ids=ids)
+                        self._journal_delete(area, ids)  # persist
                 tot += len(document_ids)
 
             # If fewer than K document IDs, break the loop
             if len(document_ids) < k:
                 break
 
-        if tot:
-            self._save_db()  # persist
         return removed
 
     async def delete_documents_by_ids(self, ids: list[str]):
         # aget_by_ids is not yet implemented in faiss, need to do a workaround
-        rem_docs = self.db.get_by_ids(ids)  # existing docs to remove (prevents error)
-        if rem_docs:
-            rem_ids = [doc.metadata["id"] for doc in rem_docs]  # ids to remove
-            await self.db.adelete(ids=rem_ids)
-
-        if rem_docs:
-            self._save_db()  # persist
+        rem_docs = []
+        with self.lock:
+            for area, area_ids in self._get_ids_by_area(ids).items():
+                # existing docs to remove (prevents error)
+                rem_docs += self.dbs[area].get_by_ids(area_ids)
+                self.dbs[area].delete(ids=area_ids)
+                self._journal_delete(area, area_ids)  # persist
         return rem_docs
 
+    def _get_ids_by_area(self, ids: list[str]) -> dict[str, list[str]]:
+        # existing documents grouped by the area database holding them
+        result: dict[str, list[str]] = {}
+        for area, db in self.dbs.items():
+            docs = db.get_all_docs()
+            area_ids = [id for id in ids if id in docs]
+            if area_ids:
+                result[area] = area_ids
+        return result
+
     async def insert_text(self, text, metadata: dict = {}):
         doc = Document(text, metadata=metadata)
         ids = await self.insert_documents([doc])
@@ -370,28 +780,231 @@ class Memory:
                 model_config=self.agent.config.embeddings_model, input=docs_txt
             )
 
-            self.db.add_documents(documents=docs, ids=ids)
-            self._save_db()  # persist
+            # embed first so that the vectors can be journaled along with the documents
+            texts = [doc.page_content for doc in docs]
+            embedder = next(iter(self.dbs.values())).embedding_function
+            embeddings = await embedder.aembed_documents(texts)  # type: ignore
+
+            groups: dict[str, list[int]] = {}
+            for i, doc in enumerate(docs):
+                groups.setdefault(Memory.get_area(doc.metadata), []).append(i)
+            with self.lock:
+                for area, rows in groups.items():
+                    db = self._get_db(area, len(embeddings[0]))
+                    area_ids = [ids[i] for i in rows]
+                    area_texts = [texts[i] for i in rows]
+                    area_embeddings = [embeddings[i] for i in rows]
+                    metadatas = [docs[i].metadata for i in rows]
+                    db.add_embeddings(
+                        text_embeddings=list(zip(area_texts, area_embeddings)),
+                        metadatas=metadatas,
+                        ids=area_ids,
+                    )
+                    self._journal_insert(
+                        area, area_ids, area_texts, metadatas, area_embeddings
+                    )  # persist
         return ids
 
-    def _save_db(self):
-        Memory._save_db_file(self.db, self.memory_subdir)
+    def _get_db(self, area: str, dim: int) -> MyFaiss:
+        db = self.dbs.get(area)
+        if db is None:
+            # first document of a custom area
+            memory_subdir = f"{self.memory_subdir}/{area}"
+            embedder = next(iter(self.dbs.values())).embedding_function
+            db = Memory._create_db(embedder, dim, memory_subdir)  # type: ignore
+            Memory._save_db_file(db, memory_subdir)
+            self.dbs[area] = db
+        return db
+
+    def _journal_insert(
+        self,
+        area: str,
+        ids: list[str],
+        texts: list[str],
+        metadatas: list[dict],
+        embeddings: list[list[float]],
+    ):
+        Memory.journals[f"{self.memory_subdir}/{area}"].append(
+            "insert",
+            docs=[
+                {"id": id, "text": text, "metadata": metadata, "embedding": embedding}
+                for id, text, metadata, embedding in zip(
+                    ids, texts, metadatas, embeddings
+                )
+            ],
+        )
+        self._compact_if_needed(area)
+
+    def _journal_delete(self, area: str, ids: list[str]):
+        Memory.journals[f"{self.memory_subdir}/{area}"].append("delete", ids=ids)
+        self._compact_if_needed(area)
+
+    def _compact_if_needed(self, area: str):
+        db = self.dbs[area]
+        memory_subdir = f"{self.memory_subdir}/{area}"
+        journal = Memory.journals[memory_subdir]
+        index_type = Memory._get_wanted_index_type(db)
+        migrate = index_type != Memory.get_index_type(db.index) or (
+            db.get_tombstone_count() > db.index.ntotal * Memory.INDEX_TOMBSTONE_RATIO
+        )
+        if journal.ops < Memory.JOURNAL_COMPACT_OPS and not migrate:
+            return
+        task = Memory._compacting.get(memory_subdir)
+        if task and not task.done():
+            return
+        task = asyncio.create_task(
+            Memory._compact(db, memory_subdir, index_type if migrate else None)
+        )
+        task.add_done_callback(
+            lambda task: Memory._on_compacted(task, memory_subdir)
+        )
+        Memory._compacting[memory_subdir] = task
+
+    @staticmethod
+    def _on_compacted(task: asyncio.Task, memory_subdir: str):
+        # nobody awaits the compaction, a failure would otherwise only show as a growing journal
+        if task.cancelled() or not task.exception():
+            return
+        error = "".join(traceback.format_exception(task.exception()))
+        PrintStyle.error(f"Memory compaction of '{memory_subdir}' failed: {error}")
+
+    @staticmethod
+    async def _compact(db: MyFaiss, memory_subdir: str, index_type: str | None = None):
+        lock = Memory.get_lock(memory_subdir)
+        if index_type:
+            await Memory._migrate_db(db, index_type, lock)
+
+        # copy the database under the lock so that no change can slip in between,
+        # the slow serialization and disk writes then run in background
+        with lock:
+            generation = Memory.journals[memory_subdir].rotate()
+            snapshot = Memory._copy_db(db)
+        await asyncio.to_thread(
+            Memory._write_snapshot, snapshot, memory_subdir, generation
+        )
+
+    @staticmethod
+    def get_index_type(index: faiss.Index) -> str:
+        index = faiss.downcast_index(index)
+        if isinstance(index, faiss.IndexHNSW):
+            return "hnsw"
+        if isinstance(index, faiss.IndexIVFPQ):
+            return "ivfpq"
+        if isinstance(index, faiss.IndexIVF):
+            return "ivf"
+        return "flat"
+
+    @staticmethod
+    def _get_wanted_index_type(db: MyFaiss) -> str:
+        wanted = settings.get_settings()["memory_index_type"]
+        size = len(db.get_all_docs())
+        if wanted in ["ivf", "ivfpq"] and size < Memory.IVF_MIN_TRAIN_SIZE:
+            return "flat"
+        if wanted in Memory.INDEX_TYPES:
+            return wanted
+
+        # auto - select by size, with hysteresis so that the index does not flip around a threshold
+        current = Memory.get_index_type(db.index)
+        hnsw_size, ivf_size = Memory.INDEX_AUTO_HNSW_SIZE, Memory.INDEX_AUTO_IVF_SIZE
+        if current == "hnsw":
+            hnsw_size *= Memory.INDEX_AUTO_HYSTERESIS
+        elif current in ["ivf", "ivfpq"]:
+            hnsw_size *= Memory.INDEX_AUTO_HYSTERESIS
+            ivf_size *= Memory.INDEX_AUTO_HYSTERESIS
+        if size >= ivf_size:
+            return "ivf"
+        if size >= hnsw_size:
+            return "hnsw"
+        return "flat"
+
+    @staticmethod
+    def _create_index(index_type: str, vectors: np.ndarray) -> faiss.Index:
+        count, dim = vectors.shape
+        if index_type == "hnsw":
+            index = faiss.IndexHNSWFlat(dim, Memory.HNSW_M, faiss.METRIC_INNER_PRODUCT)
+            index.hnsw.efSearch = Memory.HNSW_EF_SEARCH
+        elif index_type in ["ivf", "ivfpq"]:
+            # rule of thumb number of clusters, IVF needs at least as many vectors to train
+            nlist = max(1, min(65536, int(4 * math.sqrt(count)), count))
+            quantizer = faiss.IndexFlatIP(dim)
+            if index_type == "ivfpq":
+                m = next((m for m in [64, 48, 32, 24, 16, 8, 4, 2] if dim % m == 0), 1)
+                index = faiss.IndexIVFPQ(
+                    quantizer, dim, nlist, m, 8, faiss.METRIC_INNER_PRODUCT
+                )
+            else:
+                index = faiss.IndexIVFFlat(
+                    quantizer, dim, nlist, faiss.METRIC_INNER_PRODUCT
+                )
+            index.train(vectors)
+            index.nprobe = min(Memory.IVF_NPROBE, nlist)
+            index.make_direct_map()  # allows reconstructing vectors for later migrations
+        else:
+            index = faiss.IndexFlatIP(dim)
+        if count:
+            index.add(vectors)
+        return index
+
+    @staticmethod
+    def _get_live_vectors(db: MyFaiss) -> tuple[list[str], np.ndarray]:
+        docs = db.get_all_docs()
+        live = [(i, id) for i, id in sorted(db.index_to_docstore_id.items()) if id in docs]
+        vectors = np.zeros((len(live), db.index.d), dtype=np.float32)
+        for row, (i, _) in enumerate(live):
+            vectors[row] = db.index.reconstruct(int(i))
+        return [id for _, id in live], vectors
+
+    @staticmethod
+    def _rebuild_db(db: MyFaiss, index_type: str):
+        ids, vectors = Memory._get_live_vectors(db)
+        db.set_index(
+            Memory._create_index(index_type, vectors),
+            {i: id for i, id in enumerate(ids)},
+        )
+
+    @staticmethod
+    async def _migrate_db(db: MyFaiss, index_type: str, lock: threading.RLock):
+        # training and graph building run in background, changes made meanwhile are caught up after
+        with lock:
+            ids, vectors = Memory._get_live_vectors(db)
+        index = await asyncio.to_thread(Memory._create_index, index_type, vectors)
+
+        with lock:
+            known = set(ids)
+            added = [
+                (i, id)
+                for i, id in sorted(db.index_to_docstore_id.items())
+                if id in db.get_all_docs() and id not in known
+            ]
+            if added:
+                index.add(np.array([db.index.reconstruct(int(i)) for i, _ in added], dtype=np.float32))
+            # documents deleted meanwhile stay mapped and are skipped as tombstones
+            db.set_index(index, {i: id for i, id in enumerate(ids + [id for _, id in added])})
+
+    @staticmethod
+    def _copy_db(db: MyFaiss) -> MyFaiss:
+        return MyFaiss(
+            embedding_function=db.embedding_function,
+            index=faiss.clone_index(db.index),
+            docstore=InMemoryDocstore(dict(db.get_all_docs())),
+            index_to_docstore_id=dict(db.index_to_docstore_id),
+            distance_strategy=db.distance_strategy,
+            relevance_score_fn=db.override_relevance_score_fn,
+        )
 
     @staticmethod
     def _save_db_file(db: MyFaiss, memory_subdir: str):
-        abs_dir = Memory._abs_db_dir(memory_subdir)
-        db.save_local(folder_path=abs_dir)
+        generation = Memory.journals[memory_subdir].rotate()
+        Memory._write_snapshot(db, memory_subdir, generation)
 
     @staticmethod
-    def _get_comparator(condition: str):
-        def comparator(data: dict[str, Any]):
-            try:
-                return eval(condition, {}, data)
-            except Exception as e:
-                # PrintStyle.error(f"Error evaluating condition: {e}")
-                return False
-
-        return comparator
+    def _write_snapshot(db: MyFaiss, memory_subdir: str, generation: int):
+        abs_dir = Memory._abs_db_dir(memory_subdir)
+        index_name = f"index_{generation}"
+        db.save_local(folder_path=abs_dir, index_name=index_name)
+        fsync_file(os.path.join(abs_dir, index_name + ".faiss"))
+        fsync_file(os.path.join(abs_dir, index_name + ".pkl"))
+        Memory.journals[memory_subdir].commit_snapshot(index_name, generation)
 
     @staticmethod
     def _score_normalizer(val: float) -> float:
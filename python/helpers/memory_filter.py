@@ -0,0 +1,210 @@
+import ast
+import operator
+from functools import lru_cache
+from typing import Any, Callable
+
+# comparison operators supported by the filter compiler
+COMPARE_OPS: dict[type, Callable[[Any, Any], bool]] = {
+    ast.Eq: operator.eq,
+    ast.NotEq: operator.ne,
+    ast.Lt: operator.lt,
+    ast.LtE: operator.le,
+    ast.Gt: operator.gt,
+    ast.GtE: operator.ge,
+    ast.In: lambda a, b: a in b,
+    ast.NotIn: lambda a, b: a not in b,
+}
+
+
+class MetadataIndex:
+    """Inverted index of document metadata values to document ids."""
+
+    def __init__(self):
+        self.ids: set[str] = set()
+        self.values: dict[str, dict[Any, set[str]]] = {}
+        self.unindexed: set[str] = set()  # keys with unhashable values
+
+    def add(self, id: str, metadata: dict[str, Any]):
+        self.ids.add(id)
+        for key, value in metadata.items():
+            try:
+                self.values.setdefault(key, {}).setdefault(value, set()).add(id)
+            except TypeError:
+                self.unindexed.add(key)
+
+    def remove(self, id: str, metadata: dict[str, Any]):
+        self.ids.discard(id)
+        for key, value in metadata.items():
+            try:
+                ids = self.values.get(key, {}).get(value)
+            except TypeError:
+                continue
+            if ids is not None:
+                ids.discard(id)
+                if not ids:
+                    del self.values[key][value]
+
+
+class MetadataFilter:
+    """Filter condition like "area == 'main' or area == 'fragments'" compiled without eval().
+
+    matches() evaluates a single document exactly.
+    select() narrows down candidate ids using a MetadataIndex, so that filtering
+    can happen inside the vector search instead of after it.
+    """
+
+    def __init__(self, condition: str):
+        self.condition = condition
+        try:
+            tree = ast.parse(condition.strip(), mode="eval").body
+            self._match = _compile_match(tree)
+            self._tree: ast.AST | None = tree
+        except SyntaxError:
+            self._match = lambda data: False
+            self._tree = None
+        except NotImplementedError:
+            # expressions outside of the supported subset keep the old behaviour
+            self._match = _eval_match(condition)
+            self._tree = None
+
+    def matches(self, metadata: dict[str, Any]) -> bool:
+        try:
+            return bool(self._match(metadata))
+        except Exception:
+            return False  # missing keys and type mismatches do not match
+
+    def __call__(self, metadata: dict[str, Any]) -> bool:
+        return self.matches(metadata)
+
+    def select(self, index: MetadataIndex) -> tuple[set[str] | None, bool]:
+        """Return candidate ids (None for all) and whether the candidates match exactly."""
+        if self._tree is None:
+            return None, False
+        return _select(self._tree, index)
+
+    def get_values(self, key: str) -> set | None:
+        """Return the values of a metadata key the filter can match, None if not limited."""
+        if self._tree is None:
+            return None
+        return _get_values(self._tree, key)
+
+
+@lru_cache(maxsize=256)
+def get_filter(condition: str) -> MetadataFilter:
+    return MetadataFilter(condition)
+
+
+def _compile_match(node: ast.AST) -> Callable[[dict[str, Any]], Any]:
+    if isinstance(node, ast.BoolOp):
+        parts = [_compile_match(v) for v in node.values]
+        if isinstance(node.op, ast.And):
+            return lambda data: all(p(data) for p in parts)
+        return lambda data: any(p(data) for p in parts)
+
+    if isinstance(node, ast.UnaryOp) and isinstance(node.op, ast.Not):
+        part = _compile_match(node.operand)
+        return lambda data: not part(data)
+
+    if isinstance(node, ast.Compare):
+        left = _compile_match(node.left)
+        ops = [COMPARE_OPS[type(op)] for op in node.ops if type(op) in COMPARE_OPS]
+        if len(ops) != len(node.ops):
+            raise NotImplementedError(ast.dump(node))
+        rights = [_compile_match(c) for c in node.comparators]
+
+        def compare(data: dict[str, Any]):
+            a = left(data)
+            for op, right in zip(ops, rights):
+                b = right(data)
+                if not op(a, b):
+                    return False
+                a = b
+            return True
+
+        return compare
+
+    if isinstance(node, ast.Name):
+        key = node.id
+        return lambda data: data[key]  # KeyError means no match, like NameError did
+
+    if isinstance(node, (ast.Constant, ast.List, ast.Tuple, ast.Set)):
+        value = ast.literal_eval(node)
+        return lambda data: value
+
+    raise NotImplementedError(ast.dump(node))
+
+
+def _eval_match(condition: str) -> Callable[[dict[str, Any]], Any]:
+    return lambda data: eval(condition, {}, data)
+
+
+def _select(node: ast.AST, index: MetadataIndex) -> tuple[set[str] | None, bool]:
+    if isinstance(node, ast.BoolOp):
+        parts = [_select(v, index) for v in node.values]
+        if isinstance(node.op, ast.And):
+            # intersection of the narrowed parts, exact only if all parts are
+            sets = [ids for ids, _ in parts if ids is not None]
+            ids = set.intersection(*sets) if sets else None
+            return ids, all(exact for _, exact in parts)
+        if any(ids is None for ids, _ in parts):
+            return None, False
+        return set().union(*[ids for ids, _ in parts]), all(exact for _, exact in parts)  # type: ignore
+
+    if isinstance(node, ast.UnaryOp) and isinstance(node.op, ast.Not):
+        ids, exact = _select(node.operand, index)
+        if ids is None or not exact:
+            return None, False
+        # documents without the key do not match either way, the result is a superset
+        return index.ids - ids, False
+
+    if isinstance(node, ast.Compare) and len(node.ops) == 1:
+        op = COMPARE_OPS[type(node.ops[0])]
+        left, right = node.left, node.comparators[0]
+        if isinstance(left, ast.Name) and not isinstance(right, ast.Name):
+            key, value = left.id, ast.literal_eval(right)
+            test = lambda v: op(v, value)
+        elif isinstance(right, ast.Name) and not isinstance(left, ast.Name):
+            key, value = right.id, ast.literal_eval(left)
+            test = lambda v: op(value, v)
+        else:
+            return None, False
+
+        if key in index.unindexed:
+            return None, False
+        ids = set()
+        for v, v_ids in index.values.get(key, {}).items():
+            try:
+                if test(v):
+                    ids |= v_ids
+            except Exception:
+                pass
+        return ids, True
+
+    return None, False
+
+
+def _get_values(node: ast.AST, key: str) -> set | None:
+    if isinstance(node, ast.BoolOp):
+        parts = [_get_values(v, key) for v in node.values]
+        if isinstance(node.op, ast.And):
+            sets = [values for values in parts if values is not None]
+            return set.intersection(*sets) if sets else None
+        if any(values is None for values in parts):
+            return None
+        return set().union(*parts)  # type: ignore
+
+    if isinstance(node, ast.Compare) and len(node.ops) == 1:
+        op, left, right = node.ops[0], node.left, node.comparators[0]
+        if isinstance(op, ast.Eq) and isinstance(right, ast.Name):
+            left, right = right, left  # 'main' == area
+        if not isinstance(left, ast.Name) or left.id != key or isinstance(right, ast.Name):
+            return None
+        try:
+            if isinstance(op, ast.Eq):
+                return {ast.literal_eval(right)}
+            if isinstance(op, ast.In):
+                return set(ast.literal_eval(right))
+        except TypeError:
+            pass  # unhashable values
+
+    return None
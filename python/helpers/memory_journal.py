@@ -0,0 +1,113 @@
+import json
+import os
+import re
+import threading
+from typing import Any, Iterator
+
+SNAPSHOT_FILE = "snapshot.json"
+JOURNAL_FILE_PATTERN = re.compile(r"^journal_(\d+)\.jsonl$")
+INDEX_FILE_PATTERN = re.compile(r"^index(_\d+)?\.(faiss|pkl)$")
+
+
+class MemoryJournal:
+    """Append-only log of memory changes made since the last snapshot of a database folder.
+
+    Snapshot files are named by generation and referenced from snapshot.json,
+    which is replaced atomically, so a crash never leaves a half written snapshot in use.
+    Each snapshot records the first journal generation it does not contain.
+    """
+
+    def __init__(self, db_dir: str):
+        self.db_dir = db_dir
+        self.generation = 0
+        self.ops = 0  # number of entries in the journal since the last snapshot
+        self._lock = threading.Lock()
+
+    def get_snapshot(self) -> dict[str, Any] | None:
+        path = os.path.join(self.db_dir, SNAPSHOT_FILE)
+        if not os.path.exists(path):
+            return None
+        with open(path, "r", encoding="utf-8") as f:
+            return json.load(f)
+
+    def get_index_name(self) -> str:
+        snapshot = self.get_snapshot()
+        # databases saved before journaling use langchain's default index name
+        return snapshot["index_name"] if snapshot else "index"
+
+    def append(self, op: str, **data: Any):
+        line = json.dumps({"op": op, **data}, ensure_ascii=False) + "\n"
+        with self._lock:
+            with open(self._journal_path(self.generation), "a", encoding="utf-8") as f:
+                f.write(line)
+                f.flush()
+                os.fsync(f.fileno())
+            self.ops += 1
+
+    def read(self) -> Iterator[dict[str, Any]]:
+        # entries not contained in the current snapshot, oldest first
+        snapshot = self.get_snapshot()
+        start = snapshot["journal"] if snapshot else 0
+        generations = [g for g in self._list_journals() if g >= start]
+        for generation in generations:
+            with open(self._journal_path(generation), "r", encoding="utf-8") as f:
+                for line in f:
+                    try:
+                        yield json.loads(line)
+                    except json.JSONDecodeError:
+                        pass  # torn write from a crash, entry was never acknowledged
+        # never append to a journal that may end with a torn line
+        self.generation = max(generations + [start]) + 1
+        self.ops = 0
+
+    def rotate(self) -> int:
+        # start a new journal, entries up to now belong to the next snapshot
+        with self._lock:
+            self.generation += 1
+            self.ops = 0
+            return self.generation
+
+    def commit_snapshot(self, index_name: str, generation: int):
+        # switch to the new snapshot atomically, then remove what it supersedes
+        path = os.path.join(self.db_dir, SNAPSHOT_FILE)
+        tmp_path = path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump({"index_name": index_name, "journal": generation}, f)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, path)
+
+        for file in os.listdir(self.db_dir):
+            match = INDEX_FILE_PATTERN.match(file)
+            if match and os.path.splitext(file)[0] != index_name:
+                os.remove(os.path.join(self.db_dir, file))
+        for journal in self._list_journals():
+            if journal < generation:
+                os.remove(self._journal_path(journal))
+
+    def remove_files(self):
+        # remove the database from the folder, snapshot pointer first
+        path = os.path.join(self.db_dir, SNAPSHOT_FILE)
+        if os.path.exists(path):
+            os.remove(path)
+        for file in os.listdir(self.db_dir):
+            if INDEX_FILE_PATTERN.match(file) or JOURNAL_FILE_PATTERN.match(file):
+                os.remove(os.path.join(self.db_dir, file))
+
+    def _journal_path(self, generation: int) -> str:
+        return os.path.join(self.db_dir, f"journal_{generation}.jsonl")
+
+    def _list_journals(self) -> list[int]:
+        if not os.path.exists(self.db_dir):
+            return []
+        generations = []
+        for file in os.listdir(self.db_dir):
+            match = JOURNAL_FILE_PATTERN.match(file)
+            if match:
+                generations.append(int(match.group(1)))
+        return sorted(generations)
+
+
+def fsync_file(path: str):
+    with open(path, "rb") as f:
+        os.fsync(f.fileno())
@@ -21,6 +21,63 @@ def truncate_text(agent, output, threshold=1000):
     return truncated_output
 
 
+class TruncatedText:
+    """Text received in pieces, kept only as far as truncate_text would keep it.
+
+    get() returns what truncate_text returns for the whole text, while only the
+    first and last threshold characters are stored. Carriage returns start the
+    current line over, as in a terminal.
+    """
+
+    def __init__(self, threshold: int):
+        self.threshold = int(threshold)
+        self.length = 0
+        self.head = ""  # first threshold characters
+        self.tail = ""  # last characters, at least threshold once there are as many
+
+    def append(self, text: str):
+        for i, part in enumerate(text.split("\r")):
+            if i:
+                self._erase_line()
+            self._append(part)
+
+    def get(self, agent) -> str:
+        if not self.threshold or self.length <= self.threshold:
+            return self.tail
+
+        placeholder = agent.read_prompt(
+            "fw.msg_truncated.md", length=(self.length - self.threshold)
+        )
+        start_len = (self.threshold - len(placeholder)) // 2
+        end_len = self.threshold - len(placeholder) - start_len
+        return self.head[:start_len] + placeholder + (self.tail[-end_len:] if end_len > 0 else "")
+
+    def _append(self, text: str):
+        if not text:
+            return
+        if not self.threshold:
+            self.tail += text
+            self.length += len(text)
+            return
+        if len(self.head) < self.threshold:
+            self.head += text[: self.threshold - len(self.head)]
+        self.tail += text
+        self.length += len(text)
+        if len(self.tail) > 2 * self.threshold:
+            self.tail = self.tail[-self.threshold :]
+
+    def _erase_line(self):
+        newline = self.tail.rfind("\n")
+        if newline >= 0 or len(self.tail) == self.length:
+            # the whole text is kept when no newline is found, the line started at its beginning
+            removed = len(self.tail) - newline - 1
+        else:
+            removed = len(self.tail)  # the line started in the dropped middle
+        self.tail = self.tail[: len(self.tail) - removed]
+        self.length -= removed
+        self.head = self.head[: self.length]
+
+
 def truncate_dict_by_ratio(agent, data: dict|list|str, threshold_chars: int, truncate_to: int):
     threshold_chars = int(threshold_chars)
     truncate_to = int(truncate_to)
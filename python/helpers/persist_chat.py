@@ -1,9 +1,12 @@
 from collections import OrderedDict
+from dataclasses import dataclass, field
 from datetime import datetime
+import os
+import threading
 from typing import Any
 import uuid
 from agent import Agent, AgentConfig, AgentContext
-from python.helpers import files, history
+from python.helpers import files, history, sidebar_index
 import json
 from initialize import initialize
 
@@ -12,6 +15,44 @@ from python.helpers.log import Log, LogItem
 CHATS_FOLDER = "tmp/chats"
 LOG_SIZE = 1000
 CHAT_FILE_NAME = "chat.json"
+# id, name, created_at and log guid of every saved context, enough to list them without loading
+INDEX_FILE_NAME = "index.json"
+# changes saved since chat.json was written, one json entry per line
+# the first line names the snapshot the journal continues, journals of other snapshots are ignored
+JOURNAL_FILE_NAME = "chat.journal.jsonl"
+JOURNAL_MAX_ENTRIES = 500
+JOURNAL_MIN_COMPACT_SIZE = 1024 * 1024  # journal is compacted when over this size and the snapshot size
+
+
+@dataclass
+class _AgentState:
+    agent: Agent
+    history: history.History
+    changes: int
+    topic: history.Topic
+    messages: int  # messages of the current topic saved
+    topics: int
+    data: str
+
+
+@dataclass
+class _ChatState:
+    # what was saved of a context, the next save only appends what changed since
+    context: AgentContext
+    snapshot_id: str
+    snapshot_size: int
+    meta: dict[str, Any]
+    agents: list[_AgentState]
+    log_guid: str
+    log_version: int
+    log_progress: tuple[str, int]
+    journal_size: int = 0
+    journal_entries: int = 0
+
+
+_states: dict[str, _ChatState] = {}
+_index: dict[str, dict[str, Any]] = {}  # saved contexts by id, with their context number
+_lock = threading.RLock()
 
 
 def get_chat_folder_path(ctxid: str):
@@ -28,41 +69,157 @@ def get_chat_folder_path(ctxid: str):
 
 
 def save_tmp_chat(context: AgentContext):
-    """Save context to the chats folder"""
-    path = _get_chat_file_path(context.id)
-    files.make_dirs(path)
-    data = _serialize_context(context)
-    js = _safe_json_serialize(data, ensure_ascii=False)
-    files.write_file(path, js)
+    """Save context to the chats folder, appending only changes since the last save to the journal"""
+    with _lock:
+        state = _states.get(context.id)
+        if (
+            state is None
+            or state.context is not context
+            or state.journal_entries >= JOURNAL_MAX_ENTRIES
+            or state.journal_size > max(state.snapshot_size, JOURNAL_MIN_COMPACT_SIZE)
+        ):
+            _save_snapshot(context)
+        else:
+            _append_journal(context, state)
+        _update_index(context)
 
 
 def load_tmp_chats():
-    """Load all contexts from the chats folder"""
+    """Index the contexts in the chats folder, each is loaded on first access"""
     _convert_v080_chats()
-    folders = files.list_files(CHATS_FOLDER, "*")
-    json_files = []
-    for folder_name in folders:
-        json_files.append(_get_chat_file_path(folder_name))
+    saved = _read_index()
 
     ctxids = []
-    for file in json_files:
+    with _lock:
+        for ctxid in _list_chat_folders():
+            entry = saved.get(ctxid)
+            if entry is None:
+                # not indexed yet, read it once
+                try:
+                    entry = _get_index_entry(_read_chat(ctxid))
+                except Exception as e:
+                    print(f"Error loading chat {ctxid}: {e}")
+                    continue
+            AgentContext._counter += 1
+            _index[ctxid] = {**entry, "no": AgentContext._counter}
+            sidebar_index.mark_context(ctxid)
+            ctxids.append(ctxid)
+        _write_index()
+        AgentContext._loader = load_tmp_chat
+    return ctxids
+
+
+def load_tmp_chat(ctxid: str) -> AgentContext | None:
+    """Load a saved context into memory, None if there is no such context"""
+    with _lock:
+        context = AgentContext.get_loaded(ctxid)
+        if context:
+            return context
+        entry = _index.get(ctxid)
+        if not entry:
+            return None
         try:
-            js = files.read_file(file)
-            data = json.loads(js)
-            ctx = _deserialize_context(data)
-            ctxids.append(ctx.id)
+            return _deserialize_context(_read_chat(ctxid), no=entry["no"])
         except Exception as e:
-            print(f"Error loading chat {file}: {e}")
-    return ctxids
+            print(f"Error loading chat {ctxid}: {e}")
+            return None
+
+
+def unload_tmp_chat(context: AgentContext):
+    """Save the context and remove it from memory, it is loaded again on next access"""
+    with context.unload_lock, _lock:
+        save_tmp_chat(context)
+        AgentContext.remove(context.id)
+        context.unloaded = True
+
+
+def get_chat_ids() -> list[str]:
+    with _lock:
+        return list(_index)
+
+
+def get_chat_entry(ctxid: str) -> dict[str, Any] | None:
+    with _lock:
+        return _index.get(ctxid)
 
 
 def _get_chat_file_path(ctxid: str):
     return files.get_abs_path(CHATS_FOLDER, ctxid, CHAT_FILE_NAME)
 
 
+def _get_journal_file_path(ctxid: str):
+    return files.get_abs_path(CHATS_FOLDER, ctxid, JOURNAL_FILE_NAME)
+
+
+def _get_index_file_path():
+    return files.get_abs_path(CHATS_FOLDER, INDEX_FILE_NAME)
+
+
+def _list_chat_folders() -> list[str]:
+    return [
+        folder
+        for folder in files.list_files(CHATS_FOLDER, "*")
+        if os.path.isdir(get_chat_folder_path(folder))
+    ]
+
+
+def _read_chat(ctxid: str) -> dict[str, Any]:
+    data = json.loads(files.read_file(_get_chat_file_path(ctxid)))
+    _replay_journal(data, _get_journal_file_path(ctxid))
+    return data
+
+
+def _read_index() -> dict[str, dict[str, Any]]:
+    path = _get_index_file_path()
+    if not os.path.exists(path):
+        return {}
+    try:
+        return json.loads(files.read_file(path))
+    except Exception as e:
+        print(f"Error reading chat index, chats will be indexed again: {e}")
+        return {}
+
+
+def _write_index():
+    entries = {
+        ctxid: {k: v for k, v in entry.items() if k != "no"}
+        for ctxid, entry in _index.items()
+    }
+    files.make_dirs(_get_index_file_path())
+    _write_file_atomic(_get_index_file_path(), json.dumps(entries, ensure_ascii=False))
+
+
+def _get_index_entry(data: dict[str, Any]) -> dict[str, Any]:
+    return {
+        "id": data["id"],
+        "name": data.get("name", None),
+        "created_at": data.get("created_at", datetime.fromtimestamp(0).isoformat()),
+        "log_guid": data.get("log", {}).get("guid", ""),
+    }
+
+
+def _update_index(context: AgentContext):
+    entry = {
+        **_get_index_entry(
+            {
+                "id": context.id,
+                "name": context.name,
+                "created_at": _serialize_created_at(context),
+                "log": {"guid": context.log.guid},
+            }
+        ),
+        "no": context.no,
+    }
+    if _index.get(context.id) != entry:
+        _index[context.id] = entry
+        _write_index()
+
+
 def _convert_v080_chats():
     json_files = files.list_files(CHATS_FOLDER, "*.json")
     for file in json_files:
+        if file == INDEX_FILE_NAME:
+            continue
         path = files.get_abs_path(CHATS_FOLDER, file)
         name = file.rstrip(".json")
         new = _get_chat_file_path(name)
@@ -91,24 +248,222 @@ def export_json_chat(context: AgentContext):
 def remove_chat(ctxid):
     """Remove a chat or task context"""
     path = get_chat_folder_path(ctxid)
-    files.delete_dir(path)
+    with _lock:
+        _states.pop(ctxid, None)
+        files.delete_dir(path)
+        if _index.pop(ctxid, None):
+            _write_index()
+    sidebar_index.mark_context(ctxid)
 
 
-def _serialize_context(context: AgentContext):
-    # serialize agents
+def _save_snapshot(context: AgentContext):
+    # write the whole context and start a new journal, both replaced atomically
+    state = _get_state(context)
+    data = _serialize_context(context)
+    data["snapshot_id"] = state.snapshot_id
+    js = _safe_json_serialize(data, ensure_ascii=False)
+    state.snapshot_size = len(js)
+
+    path = _get_chat_file_path(context.id)
+    files.make_dirs(path)
+    _write_file_atomic(path, js)
+    header = json.dumps({"snapshot_id": state.snapshot_id}) + "\n"
+    _write_file_atomic(_get_journal_file_path(context.id), header)
+    _states[context.id] = state
+
+
+def _get_state(context: AgentContext) -> _ChatState:
+    # taken before serializing, so changes made meanwhile are saved again rather than lost
+    return _ChatState(
+        context=context,
+        snapshot_id=str(uuid.uuid4()),
+        snapshot_size=0,
+        meta=_get_meta(context),
+        agents=[_get_agent_state(agent) for agent in _get_agents(context)],
+        log_guid=context.log.guid,
+        log_version=context.log.version,
+        log_progress=(context.log.progress, context.log.progress_no),
+    )
+
+
+def _get_agent_state(agent: Agent) -> _AgentState:
+    return _AgentState(
+        agent=agent,
+        history=agent.history,
+        changes=agent.history.changes,
+        topic=agent.history.current,
+        messages=len(agent.history.current.messages),
+        topics=len(agent.history.topics),
+        data=_safe_json_serialize(_get_agent_data(agent), ensure_ascii=False),
+    )
+
+
+def _append_journal(context: AgentContext, state: _ChatState):
+    entry: dict[str, Any] = {}
+
+    meta = _get_meta(context)
+    if meta != state.meta:
+        entry["meta"] = meta
+
+    agents = _get_agents(context)
+    new_states = [_get_agent_state(agent) for agent in agents]
+    records = []
+    for i, (agent, new) in enumerate(zip(agents, new_states)):
+        old = state.agents[i] if i < len(state.agents) else None
+        record: dict[str, Any] = {}
+        hist = agent.history
+        if (
+            old is None
+            or old.agent is not agent
+            or old.history is not new.history
+            or old.changes != new.changes
+        ):
+            # new agent or compressed history, saved whole
+            record["history"] = hist.serialize()
+        elif old.topic is new.topic and old.topics == new.topics:
+            if new.messages > old.messages:
+                record["messages"] = _serialize_messages(new.topic, old.messages, new.messages)
+        elif new.topics == old.topics + 1 and hist.topics[-1] is old.topic:
+            # the current topic was closed and a new one started
+            record["messages"] = _serialize_messages(old.topic, old.messages, None)
+            record["new_topic"] = _serialize_messages(new.topic, 0, new.messages)
+        else:
+            record["history"] = hist.serialize()
+        if old is None or old.data != new.data:
+            record["data"] = json.loads(new.data)
+        if record:
+            records.append({"index": i, "number": agent.number, **record})
+    if records or len(agents) != len(state.agents):
+        entry["agents"] = records
+        entry["agents_count"] = len(agents)
+
+    log = context.log
+    log_version = log.version
+    log_progress = (log.progress, log.progress_no)
+    if log.guid != state.log_guid:
+        entry["log"] = _serialize_log(log)
+    else:
+        items = log.output(start=state.log_version)
+        if items or log_progress != state.log_progress:
+            entry["log"] = {
+                "guid": log.guid,
+                "items": items,
+                "progress": log.progress,
+                "progress_no": log.progress_no,
+            }
+
+    if entry:
+        line = _safe_json_serialize(entry, ensure_ascii=False) + "\n"
+        with open(_get_journal_file_path(context.id), "a", encoding="utf-8") as f:
+            f.write(line)
+        state.journal_size += len(line)
+        state.journal_entries += 1
+
+    state.meta = meta
+    state.agents = new_states
+    state.log_guid = log.guid
+    state.log_version = log_version
+    state.log_progress = log_progress
+
+
+def _replay_journal(data: dict[str, Any], path: str):
+    # apply the journal of this snapshot to the serialized context
+    if not data.get("snapshot_id") or not os.path.exists(path):
+        return
+    with open(path, "r", encoding="utf-8") as f:
+        lines = f.readlines()
+    if not lines or json.loads(lines[0]).get("snapshot_id") != data["snapshot_id"]:
+        return  # written before the snapshot, which already contains it
+
+    agents: list[dict[str, Any]] = data.setdefault("agents", [])
+    log: dict[str, Any] = data.setdefault("log", {})
+    items = {item["no"]: item for item in log.get("logs", []) if "no" in item}
+
+    for line in lines[1:]:
+        try:
+            entry = json.loads(line)
+        except json.JSONDecodeError:
+            break  # torn write from a crash, nothing after it was saved
+
+        data.update(entry.get("meta", {}))
+
+        if "agents" in entry:
+            del agents[entry["agents_count"] :]
+            for record in entry["agents"]:
+                while len(agents) <= record["index"]:
+                    agents.append({"number": record["number"], "data": {}, "history": ""})
+                agent = agents[record["index"]]
+                agent["number"] = record["number"]
+                if "data" in record:
+                    agent["data"] = record["data"]
+                if "history" in record:
+                    agent["history"] = record["history"]
+                if "messages" in record or "new_topic" in record:
+                    hist = agent.get("history") or history.History(None).to_dict()
+                    if isinstance(hist, str):
+                        hist = json.loads(hist)
+                    hist["current"]["messages"].extend(record.get("messages", []))
+                    if "new_topic" in record:
+                        hist["topics"].append(hist["current"])
+                        hist["current"] = history.Topic(None).to_dict()  # type: ignore
+                        hist["current"]["messages"] = record["new_topic"]
+                    agent["history"] = hist
+
+        if "log" in entry:
+            entry_log = entry["log"]
+            if "logs" in entry_log:  # log was reset
+                items = {item["no"]: item for item in entry_log["logs"]}
+            for item in entry_log.get("items", []):
+                items[item["no"]] = item
+            log.update({k: v for k, v in entry_log.items() if k not in ("logs", "items")})
+
+    for agent in agents:
+        if isinstance(agent.get("history"), dict):
+            agent["history"] = json.dumps(agent["history"], ensure_ascii=False)
+    log["logs"] = [items[no] for no in sorted(items)][-LOG_SIZE:]
+
+
+def _serialize_messages(topic: history.Topic, start: int, end: int | None):
+    return [m.to_dict() for m in topic.messages[start:end]]
+
+
+def _get_meta(context: AgentContext) -> dict[str, Any]:
+    return {
+        "name": context.name,
+        "streaming_agent": (
+            context.streaming_agent.number if context.streaming_agent else 0
+        ),
+    }
+
+
+def _get_agents(context: AgentContext) -> list[Agent]:
     agents = []
     agent = context.agent0
     while agent:
-        agents.append(_serialize_agent(agent))
+        agents.append(agent)
         agent = agent.data.get(Agent.DATA_NAME_SUBORDINATE, None)
+    return agents
+
+
+def _get_agent_data(agent: Agent) -> dict[str, Any]:
+    return {k: v for k, v in agent.data.items() if not k.startswith("_")}
+
+
+def _write_file_atomic(path: str, content: str):
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        f.write(content)
+    os.replace(tmp_path, path)
+
+
+def _serialize_context(context: AgentContext):
+    # serialize agents
+    agents = [_serialize_agent(agent) for agent in _get_agents(context)]
 
     return {
         "id": context.id,
         "name": context.name,
-        "created_at": (
-            context.created_at.isoformat() if context.created_at
-            else datetime.fromtimestamp(0).isoformat()
-        ),
+        "created_at": _serialize_created_at(context),
         "agents": agents,
         "streaming_agent": (
             context.streaming_agent.number if context.streaming_agent else 0
@@ -117,8 +472,15 @@ def _serialize_context(context: AgentContext):
     }
 
 
+def _serialize_created_at(context: AgentContext):
+    return (
+        context.created_at.isoformat() if context.created_at
+        else datetime.fromtimestamp(0).isoformat()
+    )
+
+
 def _serialize_agent(agent: Agent):
-    data = {k: v for k, v in agent.data.items() if not k.startswith("_")}
+    data = _get_agent_data(agent)
 
     history = agent.history.serialize()
 
@@ -140,7 +502,7 @@ def _serialize_log(log: Log):
     }
 
 
-def _deserialize_context(data):
+def _deserialize_context(data, no: int | None = None):
     config = initialize()
     log = _deserialize_log(data.get("log", None))
 
@@ -156,6 +518,7 @@ def _deserialize_context(data):
         ),
         log=log,
         paused=False,
+        no=no,
         # agent0=agent0,
         # streaming_agent=straming_agent,
     )
@@ -231,7 +594,7 @@ def _deserialize_log(data: dict[str, Any]) -> "Log":
                 temp=item_data.get("temp", False),
             )
         )
-        log.updates.append(i)
+        log.mark_updated(i)
         i += 1
 
     return log
@@ -1,11 +1,20 @@
-import os, webcolors, html
+import os, webcolors, html, json
 import sys
+import threading
 from datetime import datetime
-from . import files
+from . import files, dotenv
+from .log_writer import LogWriter
+
+HTML_LOG_HEADER = "<html><body style='background-color:black;font-family: Arial, Helvetica, sans-serif;'><pre>\n"
+HTML_LOG_FOOTER = "</pre></body></html>"
 
 class PrintStyle:
     last_endline = True
     log_file_path = None
+    # log files are written in the background, the jsonl log is enabled by LOG_JSONL=true
+    _html_log: LogWriter | None = None
+    _jsonl_log: LogWriter | None = None
+    _log_lock = threading.Lock()
 
     def __init__(self, bold=False, italic=False, underline=False, font_color="default", background_color="default", padding=False, log_only=False):
         self.bold = bold
@@ -17,13 +26,29 @@ class PrintStyle:
         self.padding_added = False  # Flag to track if padding was added
         self.log_only = log_only
 
-        if PrintStyle.log_file_path is None:
+        if PrintStyle._html_log is None:
+            PrintStyle._open_logs()
+
+    @staticmethod
+    def _open_logs():
+        with PrintStyle._log_lock:
+            if PrintStyle._html_log is not None:
+                return
             logs_dir = files.get_abs_path("logs")
-            os.makedirs(logs_dir, exist_ok=True)
-            log_filename = datetime.now().strftime("log_%Y%m%d_%H%M%S.html")
-            PrintStyle.log_file_path = os.path.join(logs_dir, log_filename)
-            with open(PrintStyle.log_file_path, "w") as f:
-                f.write("<html><body style='background-color:black;font-family: Arial, Helvetica, sans-serif;'><pre>\n")
+            if dotenv.get_dotenv_value("LOG_JSONL", "false").lower() == "true":
+                PrintStyle._jsonl_log = LogWriter(logs_dir, ".jsonl")
+            PrintStyle._html_log = LogWriter(
+                logs_dir,
+                ".html",
+                header=HTML_LOG_HEADER,
+                footer=HTML_LOG_FOOTER,
+                on_rotate=PrintStyle._set_log_file_path,
+            )
+            PrintStyle.log_file_path = PrintStyle._html_log.path
+
+    @staticmethod
+    def _set_log_file_path(path: str):
+        PrintStyle.log_file_path = path
 
     def _get_rgb_color_code(self, color, is_background=False):
         try:
@@ -81,14 +106,24 @@ class PrintStyle:
             self.padding_added = True
 
     def _log_html(self, html):
-        with open(PrintStyle.log_file_path, "a", encoding='utf-8') as f: # type: ignore # add encoding='utf-8'
-            f.write(html)
+        PrintStyle._html_log.write(html) # type: ignore
+
+    def _log_jsonl(self, text, stream):
+        if PrintStyle._jsonl_log:
+            record = {
+                "time": datetime.now().isoformat(),
+                "text": text,
+                "stream": stream,
+                "font_color": self.font_color,
+                "bold": self.bold,
+            }
+            PrintStyle._jsonl_log.write(json.dumps(record, ensure_ascii=False) + "\n")
 
     @staticmethod
-    def _close_html_log():
-        if PrintStyle.log_file_path:
-            with open(PrintStyle.log_file_path, "a") as f:
-                f.write("</pre></body></html>")
+    def _close_logs():
+        for log in (PrintStyle._html_log, PrintStyle._jsonl_log):
+            if log:
+                log.close()
 
     def get(self, *args, sep=' ', **kwargs):
         text = sep.join(map(str, args))
@@ -103,6 +138,7 @@ class PrintStyle:
         if not self.log_only:
             print(styled_text, end='\n', flush=True)
         self._log_html(html_text+"<br>\n")
+        self._log_jsonl(plain_text, False)
         PrintStyle.last_endline = True
 
     def stream(self, *args, sep=' ', **kwargs):
@@ -111,6 +147,7 @@ class PrintStyle:
         if not self.log_only:
             print(styled_text, end='', flush=True)
         self._log_html(html_text)
+        self._log_jsonl(plain_text, True)
         PrintStyle.last_endline = False
 
     def is_last_line_empty(self):
@@ -145,6 +182,6 @@ class PrintStyle:
     def error(text: str):
         PrintStyle(font_color="red", padding=True).print("Error: "+text)
 
-# Ensure HTML file is closed properly when the program exits
+# Ensure log files are flushed and closed properly when the program exits
 import atexit
-atexit.register(PrintStyle._close_html_log)
+atexit.register(PrintStyle._close_logs)
@@ -0,0 +1,117 @@
+import json
+import os
+import re
+import threading
+
+from python.helpers import files
+
+# {{ include 'path' }} or {{include'path'}}
+INCLUDE_PATTERN = re.compile(r"{{\s*include\s*['\"](.*?)['\"]\s*}}")
+# {{placeholder}}, split() returns literals on even and keys on odd positions
+PLACEHOLDER_PATTERN = re.compile(r"{{(\w+)}}")
+CODE_FENCES = ("```", "~~~")
+
+
+class PromptTemplate:
+    """Prompt file compiled once into literal and placeholder parts with includes resolved."""
+
+    def __init__(self, source: str, dependencies: dict[str, int]):
+        self.is_json = files.is_full_json_template(source)
+        # read_prompt removes code fences after the placeholders are replaced, parse_prompt before
+        self.parts: list[str] = PLACEHOLDER_PATTERN.split(source)
+        self.parsed_parts: list[str] = PLACEHOLDER_PATTERN.split(
+            files.remove_code_fences(source)
+        )
+        self.has_fences = _has_fences(source)
+        # files and folders the template was built from, with their mtimes
+        self.dependencies = dependencies
+
+    def is_valid(self) -> bool:
+        for path, mtime in self.dependencies.items():
+            if _get_mtime(path) != mtime:
+                return False
+        return True
+
+    def render_text(self, **kwargs) -> str:
+        text = self._render(self.parts, str, kwargs)
+        # fences may also come from the values, without any the removal is skipped
+        if self.has_fences or any(_has_fences(str(value)) for value in kwargs.values()):
+            text = files.remove_code_fences(text)
+        return text
+
+    def render_parsed_text(self, **kwargs) -> str:
+        return self._render(self.parsed_parts, str, kwargs)
+
+    def render_json(self, **kwargs):
+        return json.loads(self._render(self.parsed_parts, json.dumps, kwargs))
+
+    def _render(self, parts: list[str], convert, kwargs: dict) -> str:
+        out = parts.copy()
+        for i in range(1, len(out), 2):
+            key = out[i]
+            # unknown placeholders are kept as they are
+            out[i] = convert(kwargs[key]) if key in kwargs else "{{" + key + "}}"
+        return "".join(out)
+
+
+_templates: dict[tuple[str, tuple[str, ...], str], PromptTemplate] = {}
+_lock = threading.Lock()
+
+
+def read_prompt(prompt_dir: str, backup_dirs: list[str], file: str, **kwargs) -> str:
+    return get_template(prompt_dir, backup_dirs, file).render_text(**kwargs)
+
+
+def parse_prompt(prompt_dir: str, backup_dirs: list[str], file: str, **kwargs):
+    template = get_template(prompt_dir, backup_dirs, file)
+    if template.is_json:
+        return template.render_json(**kwargs)
+    return template.render_parsed_text(**kwargs)
+
+
+def get_template(prompt_dir: str, backup_dirs: list[str], file: str) -> PromptTemplate:
+    key = (prompt_dir, tuple(backup_dirs), file)
+    template = _templates.get(key)
+    if template and template.is_valid():
+        return template
+
+    with _lock:
+        # adding a file to any of the folders can change which file gets resolved
+        dependencies = {dir: _get_mtime(dir) for dir in [prompt_dir, *backup_dirs]}
+        source = _load_source(
+            files.get_abs_path(prompt_dir, file), backup_dirs, dependencies
+        )
+        template = PromptTemplate(source, dependencies)
+        _templates[key] = template
+        return template
+
+
+def clear_cache():
+    _templates.clear()
+
+
+def _load_source(path: str, backup_dirs: list[str], dependencies: dict[str, int]):
+    absolute_path = files.find_file_in_dirs(path, backup_dirs)
+    with open(absolute_path, "r", encoding="utf-8") as f:
+        content = f.read()
+    dependencies[absolute_path] = _get_mtime(absolute_path)
+
+    def replace_include(match):
+        # resolve the include relative to the requested path first, backup dirs second
+        include_path = files.find_file_in_dirs(
+            os.path.join(os.path.dirname(path), match.group(1)), backup_dirs
+        )
+        return _load_source(include_path, backup_dirs, dependencies)
+
+    return INCLUDE_PATTERN.sub(replace_include, content)
+
+
+def _has_fences(text: str) -> bool:
+    return any(fence in text for fence in CODE_FENCES)
+
+
+def _get_mtime(path: str) -> int:
+    try:
+        return os.stat(path).st_mtime_ns
+    except FileNotFoundError:
+        return -1
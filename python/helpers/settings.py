@@ -44,6 +44,12 @@ class Settings(TypedDict):
     agent_memory_subdir: str
     agent_knowledge_subdir: str
 
+    chats_max_loaded: int
+    chats_max_memory: int
+    code_exec_pool_size: int
+
+    memory_index_type: str
+
     api_keys: dict[str, str]
 
     auth_login: str
@@ -388,24 +394,32 @@ def convert_out(settings: Settings) -> SettingsOutput:
         "tab": "agent",
     }
 
-    # # Memory settings section
-    # memory_fields: list[SettingsField] = []
-    # memory_fields.append(
-    #     {
-    #         "id": "memory_settings",
-    #         "title": "Memory Settings",
-    #         "description": "<settings for memory>",
-    #         "type": "text",
-    #         "value": "",
-    #     }
-    # )
-
-    # memory_section: SettingsSection = {
-    #     "id": "memory",
-    #     "title": "Memory Settings",
-    #     "description": "<settings for memory management here>",
-    #     "fields": memory_fields,
-    # }
+    # Memory settings section
+    memory_fields: list[SettingsField] = []
+    memory_fields.append(
+        {
+            "id": "memory_index_type",
+            "title": "Vector index type",
+            "description": "Type of vector index used for memory search. Auto uses exact search for small memory and switches to approximate HNSW and IVF indexes as the number of memories grows. IVF-PQ compresses vectors to save RAM at the cost of some recall.",
+            "type": "select",
+            "value": settings["memory_index_type"],
+            "options": [
+                {"value": "auto", "label": "Auto (by memory size)"},
+                {"value": "flat", "label": "Flat (exact)"},
+                {"value": "hnsw", "label": "HNSW"},
+                {"value": "ivf", "label": "IVF-Flat"},
+                {"value": "ivfpq", "label": "IVF-PQ (compressed)"},
+            ],
+        }
+    )
+
+    memory_section: SettingsSection = {
+        "id": "memory",
+        "title": "Memory",
+        "description": "Settings for agent memory storage and search.",
+        "fields": memory_fields,
+        "tab": "agent",
+    }
 
     # basic auth section
     auth_fields: list[SettingsField] = []
@@ -531,6 +545,36 @@ def convert_out(settings: Settings) -> SettingsOutput:
         }
     )
 
+    agent_fields.append(
+        {
+            "id": "chats_max_loaded",
+            "title": "Max chats in memory",
+            "description": "Chats idle for a few minutes are saved and unloaded from memory when more than this number is loaded. They are loaded again when opened. Set to 0 for no limit.",
+            "type": "number",
+            "value": settings["chats_max_loaded"],
+        }
+    )
+
+    agent_fields.append(
+        {
+            "id": "chats_max_memory",
+            "title": "Max memory for chats (MB)",
+            "description": "Idle chats are unloaded when the estimated memory of all loaded chats exceeds this size. Set to 0 for no limit.",
+            "type": "number",
+            "value": settings["chats_max_memory"],
+        }
+    )
+
+    agent_fields.append(
+        {
+            "id": "code_exec_pool_size",
+            "title": "Ready terminal sessions",
+            "description": "Number of terminal sessions connected in advance, so new chats and code execution sessions start without waiting for the connection. Every agent thread (AGENT_LOOP_THREADS) keeps this many idle shells. Set to 0 to connect on demand.",
+            "type": "number",
+            "value": settings["code_exec_pool_size"],
+        }
+    )
+
     agent_section: SettingsSection = {
         "id": "agent",
         "title": "Agent Config",
@@ -685,7 +729,7 @@ def convert_out(settings: Settings) -> SettingsOutput:
             util_model_section,
             embed_model_section,
             browser_model_section,
-            # memory_section,
+            memory_section,
             stt_section,
             api_keys_section,
             auth_section,
@@ -829,6 +873,10 @@ def get_default_settings() -> Settings:
         agent_prompts_subdir="default",
         agent_memory_subdir="default",
         agent_knowledge_subdir="custom",
+        chats_max_loaded=20,
+        chats_max_memory=1024,
+        code_exec_pool_size=0,
+        memory_index_type="auto",
         rfc_auto_docker=True,
         rfc_url="localhost",
         rfc_password="",
@@ -861,11 +909,16 @@ def _apply_settings(previous: Settings | None):
             whisper.preload, _settings["stt_model_size"]
         )  # TODO overkill, replace with background task
 
-        # force memory reload on embedding model change
-        if previous and (
+        # release the previous embedding model and force memory reload on model or index type change
+        embed_changed = previous and (
             _settings["embed_model_name"] != previous["embed_model_name"]
             or _settings["embed_model_provider"] != previous["embed_model_provider"]
             or _settings["embed_model_kwargs"] != previous["embed_model_kwargs"]
+        )
+        if embed_changed:
+            models.clear_embedding_models()
+        if embed_changed or (
+            previous and _settings["memory_index_type"] != previous["memory_index_type"]
         ):
             from python.helpers.memory import reload as memory_reload
             memory_reload()
@@ -1,72 +1,274 @@
-import select
+import asyncio
+import codecs
+import os
+import re
 import subprocess
-import time
 import sys
+from collections import deque
 from typing import Optional, Tuple
 
+if not sys.platform.startswith('win'):
+    import fcntl
+    import pty
+    import signal
+    import struct
+    import termios
+
+MAX_OUTPUT = 1024 * 1024  # characters of output kept, older output is dropped
+READ_SIZE = 64 * 1024  # bytes read at once
+
+_ANSI_ESCAPE = re.compile(r"\x1B(?:[@-Z\\-_]|\[[0-?]*[ -/]*[@-~])")
+
+
+class OutputBuffer:
+    """Text of a shell session, the oldest dropped beyond max_size.
+
+    Positions count all text ever written, so readers can keep their place
+    while old text is dropped.
+    """
+
+    def __init__(self, max_size: int = MAX_OUTPUT):
+        self.max_size = max_size
+        self.start = 0  # position of the oldest text kept
+        self.end = 0  # position after the newest text
+        self._chunks: deque[str] = deque()
+
+    def write(self, text: str):
+        if not text:
+            return
+        self._chunks.append(text)
+        self.end += len(text)
+        while self.end - self.start > self.max_size:
+            chunk = self._chunks.popleft()
+            over = self.end - self.start - self.max_size
+            if len(chunk) > over:
+                self._chunks.appendleft(chunk[over:])
+                self.start += over
+            else:
+                self.start += len(chunk)
+
+    def erase_line(self):
+        # carriage return, the text after it replaces the current line (progress bars)
+        while self._chunks:
+            chunk = self._chunks.pop()
+            newline = chunk.rfind("\n")
+            if newline >= 0:
+                self._chunks.append(chunk[: newline + 1])
+                self.end -= len(chunk) - newline - 1
+                return
+            self.end -= len(chunk)
+        self.start = self.end
+
+    def read(self, position: int) -> str:
+        """Text from position to the end, from the oldest text kept if that was dropped."""
+        length = self.end - max(position, self.start)
+        if length <= 0:
+            return ""
+        parts, size = [], 0
+        for chunk in reversed(self._chunks):
+            parts.append(chunk)
+            size += len(chunk)
+            if size >= length:
+                break
+        text = "".join(reversed(parts))
+        return text[len(text) - length :]
+
+
 class LocalInteractiveSession:
+    """Local shell, its output is read in the background as it arrives.
+
+    On Linux and macOS the output goes to a pseudo-terminal, so programs flush
+    it line by line as they would in a terminal. Input stays a pipe, commands
+    are neither echoed nor limited in length.
+    """
+
     def __init__(self):
-        self.process = None
-        self.full_output = ''
+        self.process: asyncio.subprocess.Process | None = None
+        self.output = OutputBuffer()
+        self._full_position = 0  # where the output of the current command starts
+        self._read_position = 0  # what the last read_output returned
+        self._rewound = False  # a line returned by read_output was overwritten since
+        self._decoder = codecs.getincrementaldecoder("utf-8")(errors="replace")
+        self._pending = ""  # incomplete escape sequence or line ending, completed by the next data
+        self._data = asyncio.Event()
+        self._closed = False
+        self._fd: int | None = None
+        self._reader: asyncio.Task | None = None
+        self._exit_waiter: asyncio.Task | None = None
+        self._loop: asyncio.AbstractEventLoop | None = None
 
     async def connect(self):
+        self._loop = asyncio.get_running_loop()
+        self._data = asyncio.Event()
+
         # Start a new subprocess with the appropriate shell for the OS
         if sys.platform.startswith('win'):
             # Windows
-            self.process = subprocess.Popen(
-                ['cmd.exe'],
+            self.process = await asyncio.create_subprocess_exec(
+                'cmd.exe',
                 stdin=subprocess.PIPE,
                 stdout=subprocess.PIPE,
-                stderr=subprocess.PIPE,
-                text=True,
-                bufsize=1
+                stderr=subprocess.STDOUT,
             )
+            self._reader = asyncio.create_task(self._read_pipe())
         else:
             # macOS and Linux
-            self.process = subprocess.Popen(
-                ['/bin/bash'],
-                stdin=subprocess.PIPE,
-                stdout=subprocess.PIPE,
-                stderr=subprocess.PIPE,
-                text=True,
-                bufsize=1
-            )
+            master, slave = pty.openpty()
+            attrs = termios.tcgetattr(slave)
+            attrs[1] &= ~termios.ONLCR  # keep \n line endings
+            termios.tcsetattr(slave, termios.TCSANOW, attrs)
+            fcntl.ioctl(slave, termios.TIOCSWINSZ, struct.pack("HHHH", 48, 160, 0, 0))
+            try:
+                self.process = await asyncio.create_subprocess_exec(
+                    '/bin/bash',
+                    stdin=subprocess.PIPE,
+                    stdout=slave,
+                    stderr=slave,
+                    start_new_session=True,
+                )
+            finally:
+                os.close(slave)
+            os.set_blocking(master, False)
+            self._fd = master
+            self._loop.add_reader(master, self._read_pty)
+        self._exit_waiter = asyncio.create_task(self._wait_exit())
 
     def close(self):
-        if self.process:
-            self.process.terminate()
-            self.process.wait()
+        self._closed = True
+        # children of an exited shell holding the terminal open belong to its process group
+        running = self._fd is not None or (self.process and self.process.returncode is None)
+        if self._fd is not None:
+            if self._loop and not self._loop.is_closed():
+                self._loop.remove_reader(self._fd)
+            os.close(self._fd)
+            self._fd = None
+        if self._reader:
+            self._reader.cancel()
+            self._reader = None
+        if self._exit_waiter:
+            self._exit_waiter.cancel()
+            self._exit_waiter = None
+        if self.process and running:
+            try:
+                if sys.platform.startswith('win'):
+                    self.process.kill()
+                else:
+                    # the shell and everything it started
+                    os.killpg(self.process.pid, signal.SIGKILL)
+            except ProcessLookupError:
+                pass
+        self._data.set()
 
     def send_command(self, command: str):
-        if not self.process:
+        if not self.process or not self.process.stdin:
             raise Exception("Shell not connected")
-        self.full_output = ""
-        self.process.stdin.write(command + '\n') # type: ignore
-        self.process.stdin.flush() # type: ignore
- 
+        if self.process.returncode is not None:
+            raise Exception("Shell has exited")
+        self._full_position = self.output.end
+        self.process.stdin.write((command + '\n').encode())
+
+    def send_signal(self, pid: int, sig: int):
+        # processes started in the shell run on this machine
+        try:
+            os.kill(pid, sig)
+        except ProcessLookupError:
+            pass
+
+    def is_alive(self) -> bool:
+        # children of an exited shell may still hold the terminal open
+        return bool(self.process) and self.process.returncode is None and not self._closed
+
+    async def wait_output(self, timeout: float | None = None) -> bool:
+        """Wait until there is output not yet returned by read_output, or the shell exits."""
+        if self._has_new_output():
+            return True
+        self._data.clear()
+        try:
+            await asyncio.wait_for(self._data.wait(), timeout)
+        except asyncio.TimeoutError:
+            pass
+        return self._has_new_output()
+
     async def read_output(self, timeout: float = 0, reset_full_output: bool = False) -> Tuple[str, Optional[str]]:
+        """Output since the last call and of the current command, partial output None if there is none.
+
+        Output is collected in background, so this never waits. timeout is not used,
+        it is accepted for the interface shared with SSHInteractiveSession.
+        """
         if not self.process:
             raise Exception("Shell not connected")
 
         if reset_full_output:
-            self.full_output = ""
-        partial_output = ''
-        start_time = time.time()
-        
-        while (timeout <= 0 or time.time() - start_time < timeout):
-            rlist, _, _ = select.select([self.process.stdout], [], [], 0.1)
-            if rlist:
-                line = self.process.stdout.readline()  # type: ignore
-                if line:
-                    partial_output += line
-                    self.full_output += line
-                    time.sleep(0.1)
-                else:
-                    break  # No more output
-            else:
-                break  # No data available
+            self._full_position = self._read_position
+        partial_output = self.output.read(self._read_position)
+        if self._rewound:
+            partial_output = "\r" + partial_output
+            self._rewound = False
+        self._read_position = self.output.end
+        full_output = self.output.read(self._full_position)
 
         if not partial_output:
-            return self.full_output, None
-        
-        return self.full_output, partial_output
\ No newline at end of file
+            return full_output, None
+
+        return full_output, partial_output
+
+    def _has_new_output(self) -> bool:
+        return self.output.end != self._read_position or not self.is_alive()
+
+    async def _wait_exit(self):
+        # wakes up waiters when the shell exits, its output may not end then
+        await self.process.wait()  # type: ignore
+        self._exit_waiter = None
+        self._data.set()
+
+    def _read_pty(self):
+        try:
+            data = os.read(self._fd, READ_SIZE)  # type: ignore
+        except BlockingIOError:
+            return
+        except OSError:
+            data = b""  # EIO once the shell and its children closed the terminal
+        if data:
+            self._write(self._decoder.decode(data))
+        else:
+            self._write(self._decoder.decode(b"", final=True), final=True)
+            self.close()
+
+    async def _read_pipe(self):
+        stdout = self.process.stdout  # type: ignore
+        while True:
+            data = await stdout.read(READ_SIZE)
+            if not data:
+                break
+            self._write(self._decoder.decode(data))
+        self._write(self._decoder.decode(b"", final=True), final=True)
+        self._reader = None
+        self._closed = True
+        self._data.set()
+
+    def _write(self, text: str, final: bool = False):
+        text, self._pending = _split_pending(self._pending + text, final)
+        text = _ANSI_ESCAPE.sub("", text).replace("\r\n", "\n")
+        lines = text.split("\r")
+        self.output.write(lines[0])
+        for line in lines[1:]:
+            self.output.erase_line()
+            if self._read_position > self.output.end:
+                # the reader got part of the erased line, its next output starts with \r
+                self._read_position = self.output.end
+                self._rewound = True
+            self._full_position = min(self._full_position, self.output.end)
+            self.output.write(line)
+        self._data.set()
+
+
+def _split_pending(text: str, final: bool) -> tuple[str, str]:
+    # holds back an escape sequence or \r\n cut in two by the read
+    if final:
+        return text, ""
+    escape = text.rfind("\x1b", max(0, len(text) - 32))
+    if escape >= 0 and not _ANSI_ESCAPE.match(text, escape):
+        return text[:escape], text[escape:]
+    if text.endswith("\r"):
+        return text[:-1], "\r"
+    return text, ""
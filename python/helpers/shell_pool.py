@@ -0,0 +1,112 @@
+import asyncio
+import threading
+from collections import deque
+from typing import TYPE_CHECKING
+
+from python.helpers import rfc_exchange, errors
+from python.helpers.log import Log
+from python.helpers.print_style import PrintStyle
+from python.helpers.shell_local import LocalInteractiveSession
+from python.helpers.shell_ssh import SSHInteractiveSession
+
+if TYPE_CHECKING:
+    from agent import AgentConfig
+
+Shell = LocalInteractiveSession | SSHInteractiveSession
+
+_lock = threading.Lock()
+_pools: dict[tuple, "ShellPool"] = {}  # (event loop, backend) -> pool
+
+
+class ShellPool:
+    """Connected shells of one backend kept ready on one event loop.
+
+    Local shells read their output through the loop they were started on,
+    so every loop has pools of its own.
+    """
+
+    def __init__(self, loop: asyncio.AbstractEventLoop):
+        self.loop = loop
+        self.shells: deque[Shell] = deque()
+        self._filling: asyncio.Task | None = None
+
+    def take(self) -> Shell | None:
+        # shells that died while waiting are dropped
+        while self.shells:
+            shell = self.shells.popleft()
+            if shell.is_alive():
+                return shell
+            shell.close()
+        return None
+
+    def fill(self, config: "AgentConfig"):
+        """Connect shells in the background until the pool holds the configured number."""
+        if self._filling and not self._filling.done():
+            return
+        if len(self.shells) == config.code_exec_pool_size:
+            return  # nothing to connect or close
+        self._filling = self.loop.create_task(self._fill(config))
+
+    async def _fill(self, config: "AgentConfig"):
+        try:
+            while len(self.shells) < config.code_exec_pool_size:
+                # connection messages of the background go to the console only
+                self.shells.append(await connect(config, Log()))
+            # the size may have been lowered since
+            while len(self.shells) > config.code_exec_pool_size:
+                self.shells.pop().close()
+        except Exception as e:
+            PrintStyle.warning(f"Shell pool not filled: {errors.format_error(e)}")
+
+    def close(self):
+        if self._filling:
+            self._filling.cancel()
+        while self.shells:
+            self.shells.pop().close()
+
+
+async def get_shell(config: "AgentConfig", logger: Log) -> Shell:
+    """A connected shell for the backend of the config, from the pool of the running loop when one is ready."""
+    pool = _get_pool(config)
+    shell = pool.take()
+    pool.fill(config)  # replaces the shell taken, or warms the pool for the next one
+    return shell or await connect(config, logger)
+
+
+async def connect(config: "AgentConfig", logger: Log) -> Shell:
+    if config.code_exec_ssh_enabled:
+        pswd = (
+            config.code_exec_ssh_pass
+            if config.code_exec_ssh_pass
+            else await rfc_exchange.get_root_password()
+        )
+        shell = SSHInteractiveSession(
+            logger,
+            config.code_exec_ssh_addr,
+            config.code_exec_ssh_port,
+            config.code_exec_ssh_user,
+            pswd,
+        )
+        # paramiko blocks while connecting, ssh shells are not tied to a loop
+        await asyncio.to_thread(asyncio.run, shell.connect())
+    else:
+        shell = LocalInteractiveSession()
+        await shell.connect()
+    return shell
+
+
+def _get_pool(config: "AgentConfig") -> ShellPool:
+    loop = asyncio.get_running_loop()
+    backend = (
+        ("ssh", config.code_exec_ssh_addr, config.code_exec_ssh_port, config.code_exec_ssh_user)
+        if config.code_exec_ssh_enabled
+        else ("local",)
+    )
+    with _lock:
+        # pools of stopped loops cannot be used anymore
+        for key in [key for key, pool in _pools.items() if pool.loop.is_closed()]:
+            _pools.pop(key).close()
+        pool = _pools.get((loop, backend))
+        if not pool:
+            pool = _pools[(loop, backend)] = ShellPool(loop)
+        return pool
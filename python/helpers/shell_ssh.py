@@ -81,6 +81,23 @@ class SSHInteractiveSession:
         self.trimmed_command_length = 0
         self.shell.send(self.last_command)
 
+    def send_signal(self, pid: int, sig: int):
+        # the process runs on the remote machine, signalled through a command of its own
+        self.client.exec_command(f"kill -{int(sig)} {int(pid)}")
+
+    def is_alive(self) -> bool:
+        return bool(self.shell) and not self.shell.closed  # type: ignore
+
+    async def wait_output(self, timeout: float | None = None) -> bool:
+        """Wait until there is output to read or the shell closes."""
+        # paramiko channels cannot notify an event loop, so this polls
+        start_time = time.time()
+        while self.is_alive() and not self.shell.recv_ready():  # type: ignore
+            if timeout is not None and time.time() - start_time >= timeout:
+                return False
+            await asyncio.sleep(0.05)
+        return True
+
     async def read_output(
         self, timeout: float = 0, reset_full_output: bool = False
     ) -> Tuple[str, str]:
@@ -129,7 +146,7 @@ class SSHInteractiveSession:
 
             partial_output += data
             self.full_output += data
-            await asyncio.sleep(0.1)  # Prevent busy waiting
+            await asyncio.sleep(0)  # let other tasks run between chunks, the loop ends when nothing is ready
 
         # Decode once at the end
         decoded_partial_output = partial_output.decode("utf-8", errors="replace")
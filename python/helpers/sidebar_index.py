@@ -0,0 +1,150 @@
+import threading
+import time
+from datetime import datetime
+from typing import Any
+
+from python.helpers import changes
+from python.helpers.localization import Localization
+
+# serialized chats and tasks of the web ui sidebar, updated incrementally
+# the version changes with every change of the lists, polls with the current version skip them
+_lock = threading.RLock()  # held while serializing, which locks the scheduler tasks
+_marks_lock = threading.Lock()  # never held while calling out, marks may come with the scheduler locked
+_version = int(time.time() * 1000)  # not reused by a restarted server, so old client versions never match
+_entries: dict[str, dict[str, Any]] = {}  # context id -> serialized chat or task
+_task_ids: set[str] = set()  # contexts serialized as tasks
+_dirty: set[str] = set()  # contexts to serialize again
+_lists: tuple[list[dict], list[dict]] | None = None  # sorted chats and tasks
+_timezone: str | None = None  # dates are serialized in the user's timezone
+
+# change while the agent works and are not shown in the sidebar
+_VOLATILE_FIELDS = ("log_version", "log_length", "paused")
+
+
+def mark_context(id: str):
+    """Serialize the context again on the next read, after it was created, changed or removed."""
+    with _marks_lock:
+        _dirty.add(id)
+    changes.notify()
+
+
+def mark_tasks(ids: list[str]):
+    """Serialize task contexts again after the scheduler tasks changed, ids are the current task uuids."""
+    with _marks_lock:
+        _dirty.update(ids)
+        _dirty.update(_task_ids)
+    changes.notify()
+
+
+def get_version() -> int:
+    with _lock:
+        _refresh()
+        return _version
+
+
+def get_lists() -> tuple[int, list[dict], list[dict]]:
+    """Current version, chats and tasks, each sorted by creation date, newest first."""
+    global _lists
+    with _lock:
+        _refresh()
+        if _lists is None:
+            ctxs = [e for id, e in _entries.items() if id not in _task_ids]
+            tasks = [e for id, e in _entries.items() if id in _task_ids]
+            ctxs.sort(key=lambda x: x["created_at"], reverse=True)
+            tasks.sort(key=lambda x: x["created_at"], reverse=True)
+            _lists = (ctxs, tasks)
+        return _version, _lists[0], _lists[1]
+
+
+def _refresh():
+    global _timezone, _version, _lists
+    with _marks_lock:
+        timezone = Localization.get().get_timezone()
+        if timezone != _timezone:
+            _timezone = timezone
+            _dirty.update(_entries)
+        if not _dirty:
+            return
+        dirty = list(_dirty)
+        _dirty.clear()
+
+    from python.helpers.task_scheduler import TaskScheduler
+
+    scheduler = TaskScheduler.get()
+    changed = False
+    for id in dirty:
+        entry, is_task = _serialize(id, scheduler)
+        if entry == _entries.get(id) and is_task == (id in _task_ids):
+            continue
+        changed = True
+        if entry is None:
+            _entries.pop(id, None)
+        else:
+            _entries[id] = entry
+        with _marks_lock:
+            if is_task:
+                _task_ids.add(id)
+            else:
+                _task_ids.discard(id)
+
+    if changed:
+        _version += 1
+        _lists = None
+
+
+def _serialize(id: str, scheduler) -> tuple[dict[str, Any] | None, bool]:
+    from agent import AgentContext
+    from python.helpers import persist_chat
+
+    # Create the base context data that will be returned
+    # contexts not loaded yet are listed from the saved chats index
+    ctx = AgentContext.get_loaded(id)
+    saved = persist_chat.get_chat_entry(id) if not ctx else None
+    if ctx:
+        context_data = ctx.serialize()
+        for key in _VOLATILE_FIELDS:
+            context_data.pop(key, None)
+    elif saved:
+        context_data = {
+            "id": id,
+            "name": saved["name"],
+            "created_at": Localization.get().serialize_datetime(
+                datetime.fromisoformat(saved["created_at"])
+            ),
+            "no": saved["no"],
+            "log_guid": saved["log_guid"],
+        }
+    else:
+        return None, False
+
+    context_task = scheduler.get_task_by_uuid(id)
+    # Determine if this is a task-dedicated context by checking if a task with this UUID exists
+    if context_task is None or context_task.context_id != id:
+        return context_data, False
+
+    # If this is a task, get task details from the scheduler
+    task_details = scheduler.serialize_task(id)
+    if task_details:
+        # Add task details to context_data with the same field names
+        # as used in scheduler endpoints to maintain UI compatibility
+        context_data.update({
+            "task_name": task_details.get("name"), # name is for context, task_name for the task name
+            "uuid": task_details.get("uuid"),
+            "state": task_details.get("state"),
+            "type": task_details.get("type"),
+            "system_prompt": task_details.get("system_prompt"),
+            "prompt": task_details.get("prompt"),
+            "last_run": task_details.get("last_run"),
+            "last_result": task_details.get("last_result"),
+            "attachments": task_details.get("attachments", []),
+            "context_id": task_details.get("context_id"),
+        })
+
+        # Add type-specific fields
+        if task_details.get("type") == "scheduled":
+            context_data["schedule"] = task_details.get("schedule")
+        elif task_details.get("type") == "planned":
+            context_data["plan"] = task_details.get("plan")
+        else:
+            context_data["token"] = task_details.get("token")
+    return context_data, True
@@ -22,6 +22,7 @@ from python.helpers.print_style import PrintStyle
 from python.helpers.defer import DeferredTask
 from python.helpers.files import get_abs_path, make_dirs, read_file, write_file
 from python.helpers.localization import Localization
+from python.helpers import sidebar_index
 import pytz
 from typing import Annotated
 
@@ -470,8 +471,11 @@ class SchedulerTaskList(BaseModel):
         if exists(path):
             with self._lock:
                 data = self.__class__.model_validate_json(read_file(path))
+                changed = data.tasks != self.tasks
                 self.tasks.clear()
                 self.tasks.extend(data.tasks)
+                if changed:
+                    sidebar_index.mark_tasks([task.uuid for task in self.tasks])
         return self
 
     async def add_task(self, task: Union[ScheduledTask, AdHocTask, PlannedTask]) -> "SchedulerTaskList":
@@ -518,6 +522,7 @@ class SchedulerTaskList(BaseModel):
                         "ERROR: Null token persisted in JSON file for an adhoc task"
                     )
 
+        sidebar_index.mark_tasks([task.uuid for task in self.tasks])
         return self
 
     async def update_task_by_uuid(
@@ -746,6 +751,9 @@ class TaskScheduler:
 
     async def _run_task(self, task: Union[ScheduledTask, AdHocTask, PlannedTask], task_context: str | None = None):
 
+        # runs on the loop of the task's context, shared with the chats
+        loop_key = task.context_id or task.uuid
+
         async def _run_task_wrapper(task_uuid: str, task_context: str | None = None):
 
             # preflight checks with a snapshot of the task
@@ -866,8 +874,18 @@ class TaskScheduler:
                 # Make one final save to ensure all states are persisted
                 await self._tasks.save()
 
-        deferred_task = DeferredTask(thread_name=self.__class__.__name__)
-        deferred_task.start_task(_run_task_wrapper, task.uuid, task_context)
+        async def _run_task_on_loop(task_uuid: str, task_context: str | None = None):
+            try:
+                await _run_task_wrapper(task_uuid, task_context)
+            finally:
+                # contexts release their loop when removed, a key without a loaded context is released here
+                if not AgentContext.get_loaded(loop_key):
+                    AgentContext.get_loop_pool().release(loop_key)
+
+        deferred_task = DeferredTask(
+            thread_name=AgentContext.get_loop_pool().get_thread_name(loop_key)
+        )
+        deferred_task.start_task(_run_task_on_loop, task.uuid, task_context)
 
         # Ensure background execution doesn't exit immediately on async await, especially in script contexts
         # This helps prevent premature exits when running from non-event-loop contexts
@@ -4,13 +4,23 @@ import tiktoken
 APPROX_BUFFER = 1.1
 TRIM_BUFFER = 0.8
 
+_encodings: dict[str, tiktoken.Encoding] = {}
+
+
+def get_encoding(encoding_name="cl100k_base") -> tiktoken.Encoding:
+    # encodings are immutable and thread safe, load each one only once
+    encoding = _encodings.get(encoding_name)
+    if encoding is None:
+        encoding = _encodings[encoding_name] = tiktoken.get_encoding(encoding_name)
+    return encoding
+
 
 def count_tokens(text: str, encoding_name="cl100k_base") -> int:
     if not text:
         return 0
 
     # Get the encoding
-    encoding = tiktoken.get_encoding(encoding_name)
+    encoding = get_encoding(encoding_name)
 
     # Encode the text and count the tokens
     tokens = encoding.encode(text)
@@ -11,6 +11,7 @@ from langchain_community.vectorstores.utils import (
 from langchain.embeddings import CacheBackedEmbeddings
 
 from agent import Agent
+from python.helpers.memory_filter import get_filter
 
 
 class MyFaiss(FAISS):
@@ -39,7 +40,7 @@ class VectorDB:
             ),
         )
 
-        self.index = faiss.IndexFlatIP(len(self.embedder.embed_query("example")))
+        self.index = faiss.IndexFlatIP(agent.get_embedding_dimension())
 
         self.db = MyFaiss(
             embedding_function=self.embedder,
@@ -54,7 +55,7 @@ class VectorDB:
     async def search_similarity_threshold(
         self, query: str, limit: int, threshold: float, filter: str = ""
     ):
-        comparator = get_comparator(filter) if filter else None
+        comparator = get_filter(filter) if filter else None
 
         # rate limiter
         await self.agent.rate_limiter(
@@ -104,13 +105,3 @@ def cosine_normalizer(val: float) -> float:
     )  # float precision can cause values like 1.0000000596046448
     return res
 
-
-def get_comparator(condition: str):
-    def comparator(data: dict[str, Any]):
-        try:
-            return eval(condition, {}, data)
-        except Exception as e:
-            # PrintStyle.error(f"Error evaluating condition: {e}")
-            return False
-
-    return comparator
@@ -1,21 +1,28 @@
-import asyncio
-from dataclasses import dataclass
-import shlex
+from dataclasses import dataclass, field
 import time
 from python.helpers.tool import Tool, Response
-from python.helpers import files, rfc_exchange
+from python.helpers import files, shell_pool
 from python.helpers.print_style import PrintStyle
 from python.helpers.shell_local import LocalInteractiveSession
 from python.helpers.shell_ssh import SSHInteractiveSession
 from python.helpers.docker import DockerContainerManager
-from python.helpers.messages import truncate_text
+from python.helpers.messages import TruncatedText
+from python.helpers.kernel import Kernel
+from collections import deque
 import re
 
+OUTPUT_THRESHOLD = 10000  # characters of output returned, the middle of longer output is cut
+LOG_UPDATE_INTERVAL = 0.25  # seconds between updates of the log item while output streams
+WAIT_INTERVAL = 0.5  # seconds between intervention checks while there is no output
+PROMPT_LINE_LENGTH = 1024  # characters at the end of a line checked for a shell prompt
+INTERRUPT_TIMEOUT = 5  # seconds to wait for interrupted code to stop
+
 
 @dataclass
 class State:
     shells: dict[int, LocalInteractiveSession | SSHInteractiveSession]
     docker: DockerContainerManager | None
+    kernels: dict[tuple[int, str], Kernel] = field(default_factory=dict)  # (session, runtime) -> kernel
 
 
 class CodeExecution(Tool):
@@ -44,9 +51,15 @@ class CodeExecution(Tool):
                 command=self.args["code"], session=session
             )
         elif runtime == "output":
-            response = await self.get_terminal_output(
-                session=session, first_output_timeout=60, between_output_timeout=5
-            )
+            kernel = self.get_running_kernel(session)
+            if kernel:
+                response = await self.get_kernel_output(
+                    kernel, first_output_timeout=60, between_output_timeout=5
+                )
+            else:
+                response = await self.get_terminal_output(
+                    session=session, first_output_timeout=60, between_output_timeout=5
+                )
         elif runtime == "reset":
             response = await self.reset_terminal(session=session)
         else:
@@ -90,6 +103,7 @@ class CodeExecution(Tool):
 
             # initialize shells dictionary if not exists
             shells = {} if not self.state else self.state.shells.copy()
+            kernels = {} if not self.state else self.state.kernels.copy()
 
             # Only reset the specified session if provided
             if session is not None and session in shells:
@@ -101,39 +115,31 @@ class CodeExecution(Tool):
                     shells[s].close()
                 shells = {}
 
+            # kernels of the session are reset with it
+            if session is not None:
+                for key in [key for key in kernels if key[0] == session]:
+                    kernels.pop(key).close()
+            elif reset:
+                for kernel in kernels.values():
+                    kernel.close()
+                kernels = {}
+
             # initialize local or remote interactive shell interface for session 0 if needed
             if 0 not in shells:
-                if self.agent.config.code_exec_ssh_enabled:
-                    pswd = (
-                        self.agent.config.code_exec_ssh_pass
-                        if self.agent.config.code_exec_ssh_pass
-                        else await rfc_exchange.get_root_password()
-                    )
-                    shell = SSHInteractiveSession(
-                        self.agent.context.log,
-                        self.agent.config.code_exec_ssh_addr,
-                        self.agent.config.code_exec_ssh_port,
-                        self.agent.config.code_exec_ssh_user,
-                        pswd,
-                    )
-                else:
-                    shell = LocalInteractiveSession()
-
-                shells[0] = shell
-                await shell.connect()
+                shells[0] = await self.new_shell()
 
-            self.state = State(shells=shells, docker=docker)
+            self.state = State(shells=shells, docker=docker, kernels=kernels)
         self.agent.set_data("_cet_state", self.state)
 
+    async def new_shell(self):
+        # a warm shell of the pool when one is ready, connecting takes a while over ssh
+        return await shell_pool.get_shell(self.agent.config, self.agent.context.log)
+
     async def execute_python_code(self, session: int, code: str, reset: bool = False):
-        escaped_code = shlex.quote(code)
-        command = f"ipython -c {escaped_code}"
-        return await self.terminal_session(session, command, reset)
+        return await self.kernel_session(session, "python", code, reset)
 
     async def execute_nodejs_code(self, session: int, code: str, reset: bool = False):
-        escaped_code = shlex.quote(code)
-        command = f"node /exe/node_eval.js {escaped_code}"
-        return await self.terminal_session(session, command, reset)
+        return await self.kernel_session(session, "nodejs", code, reset)
 
     async def execute_terminal_command(
         self, session: int, command: str, reset: bool = False
@@ -151,23 +157,7 @@ class CodeExecution(Tool):
                     await self.reset_terminal()
 
                 if session not in self.state.shells:
-                    if self.agent.config.code_exec_ssh_enabled:
-                        pswd = (
-                            self.agent.config.code_exec_ssh_pass
-                            if self.agent.config.code_exec_ssh_pass
-                            else await rfc_exchange.get_root_password()
-                        )
-                        shell = SSHInteractiveSession(
-                            self.agent.context.log,
-                            self.agent.config.code_exec_ssh_addr,
-                            self.agent.config.code_exec_ssh_port,
-                            self.agent.config.code_exec_ssh_user,
-                            pswd,
-                        )
-                    else:
-                        shell = LocalInteractiveSession()
-                    self.state.shells[session] = shell
-                    await shell.connect()
+                    self.state.shells[session] = await self.new_shell()
 
                 self.state.shells[session].send_command(command)
 
@@ -185,6 +175,145 @@ class CodeExecution(Tool):
                 else:
                     raise e
 
+    async def kernel_session(
+        self, session: int, runtime: str, code: str, reset: bool = False
+    ):
+
+        await self.agent.handle_intervention()  # wait for intervention and handle it, if paused
+
+        if reset:
+            await self.reset_terminal(session=session)
+
+        key = (session, runtime)
+        kernel = self.state.kernels.get(key)
+        if kernel and kernel.running:
+            response = self.agent.read_prompt(
+                "fw.code.info.md",
+                info=self.agent.read_prompt(
+                    "fw.code.running.md", runtime=runtime, session=session
+                ),
+            )
+            self.log.update(content=response)
+            return response
+
+        # the interpreter keeps running in its own shell, variables and imports stay between calls
+        if not kernel or not kernel.is_alive():
+            if kernel:
+                kernel.close()
+                del self.state.kernels[key]
+            kernel = Kernel(await self.new_shell(), runtime)
+            try:
+                await kernel.start()
+            except Exception:
+                kernel.close()
+                raise
+            self.state.kernels[key] = kernel
+
+        kernel.execute(code)
+
+        PrintStyle(
+            background_color="white", font_color="#1B4F72", bold=True
+        ).print(f"{self.agent.agent_name} code execution output")
+        return await self.get_kernel_output(kernel)
+
+    def get_running_kernel(self, session: int) -> Kernel | None:
+        for (kernel_session, _), kernel in self.state.kernels.items():
+            if kernel_session == session and kernel.running:
+                return kernel
+        return None
+
+    async def get_kernel_output(
+        self,
+        kernel: Kernel,
+        first_output_timeout=30,  # Wait up to x seconds for first output
+        between_output_timeout=15,  # Wait up to x seconds between outputs
+        max_exec_timeout=180,  # hard cap on total runtime, the code is interrupted then
+    ):
+        start_time = time.time()
+        last_output_time = start_time
+        last_log_time = 0.0
+        output = TruncatedText(OUTPUT_THRESHOLD)
+        got_output = False
+
+        def add_output(text: str):
+            nonlocal last_output_time, last_log_time, got_output
+            now = time.time()
+            PrintStyle(font_color="#85C1E9").stream(text)
+            output.append(text)
+            last_output_time = now
+            got_output = True
+            if now - last_log_time >= LOG_UPDATE_INTERVAL:
+                self.log.update(content=output.get(self.agent))
+                last_log_time = now
+
+        def respond(sysinfo: str | None = None):
+            response = output.get(self.agent)
+            if sysinfo:
+                PrintStyle.warning(sysinfo)
+                info = self.agent.read_prompt("fw.code.info.md", info=sysinfo)
+                response = (response + "\n\n" + info) if response else info
+            self.log.update(content=response)
+            return response
+
+        while True:
+            # wake up on new output, the end of the code, or to check timeouts and interventions
+            deadline = min(
+                start_time + max_exec_timeout,
+                (last_output_time + between_output_timeout) if got_output else (start_time + first_output_timeout),
+            )
+            text, result = await kernel.read(max(0, min(deadline - time.time(), WAIT_INTERVAL)))
+            if text:
+                add_output(text)
+
+            # the code finished, its output is complete
+            if result:
+                return respond(self.get_kernel_status_info(kernel, result))
+
+            await self.agent.handle_intervention()
+
+            now = time.time()
+            if now - start_time > max_exec_timeout:
+                kernel.interrupt()
+                interrupt_time = time.time()
+                while kernel.running and time.time() - interrupt_time < INTERRUPT_TIMEOUT:
+                    text, result = await kernel.read(INTERRUPT_TIMEOUT - (time.time() - interrupt_time))
+                    if text:
+                        add_output(text)
+                if kernel.running or not result:
+                    return respond(
+                        self.agent.read_prompt("fw.code.max_time.md", timeout=max_exec_timeout)
+                    )
+                return respond(
+                    self.get_kernel_status_info(kernel, result, timeout=max_exec_timeout)
+                )
+
+            if not got_output:
+                if now - start_time > first_output_timeout:
+                    return respond(
+                        self.agent.read_prompt("fw.code.no_out_time.md", timeout=first_output_timeout)
+                    )
+            elif now - last_output_time > between_output_timeout:
+                return respond(
+                    self.agent.read_prompt("fw.code.pause_time.md", timeout=between_output_timeout)
+                )
+
+    def get_kernel_status_info(
+        self, kernel: Kernel, result: dict, timeout: float | None = None
+    ) -> str | None:
+        # errors show in the output already, an ended or interrupted session is reported
+        status = result.get("status")
+        if status == "exit":
+            return self.agent.read_prompt(
+                "fw.code.exited.md",
+                runtime=kernel.runtime,
+                code=result.get("error") or "unknown",
+            )
+        if status == "interrupted":
+            if timeout:
+                return self.agent.read_prompt("fw.code.interrupted.md", timeout=timeout)
+            return self.agent.read_prompt("fw.code.interrupted_signal.md")
+        return None
+
     async def get_terminal_output(
         self,
         session=0,
@@ -192,7 +321,6 @@ class CodeExecution(Tool):
         first_output_timeout=30,  # Wait up to x seconds for first output
         between_output_timeout=15,  # Wait up to x seconds between outputs
         max_exec_timeout=180,  #hard cap on total runtime
-        sleep_time=0.1,
     ):
         # Common shell prompt regex patterns (add more as needed)
         prompt_patterns = [
@@ -201,15 +329,22 @@ class CodeExecution(Tool):
             re.compile(r"[a-zA-Z0-9_.-]+@[^:]+:[^$#]+[$#] ?$"),  # user@host:~$
         ]
 
+        shell = self.state.shells[session]
         start_time = time.time()
         last_output_time = start_time
-        full_output = ""
-        truncated_output = ""
+        last_log_time = 0.0
+        output = TruncatedText(OUTPUT_THRESHOLD)
+        lines: deque[str] = deque([""], maxlen=4)  # last lines for prompt detection, the last one incomplete
         got_output = False
 
         while True:
-            await asyncio.sleep(sleep_time)
-            full_output, partial_output = await self.state.shells[session].read_output(
+            # wake up on new output, or to check timeouts and interventions
+            deadline = min(
+                start_time + max_exec_timeout,
+                (last_output_time + between_output_timeout) if got_output else (start_time + first_output_timeout),
+            )
+            await shell.wait_output(max(0, min(deadline - time.time(), WAIT_INTERVAL)))
+            _, partial_output = await shell.read_output(
                 timeout=3, reset_full_output=reset_full_output
             )
             reset_full_output = False  # only reset once
@@ -219,30 +354,40 @@ class CodeExecution(Tool):
             now = time.time()
             if partial_output:
                 PrintStyle(font_color="#85C1E9").stream(partial_output)
-                # full_output += partial_output # Append new output
-                truncated_output = truncate_text(
-                    agent=self.agent, output=full_output, threshold=10000
-                )
-                self.log.update(content=truncated_output)
+                output.append(partial_output)
+                _add_lines(lines, partial_output)
                 last_output_time = now
                 got_output = True
 
+                # the ui gets only the appended text, at most a few times a second
+                if now - last_log_time >= LOG_UPDATE_INTERVAL:
+                    self.log.update(content=output.get(self.agent))
+                    last_log_time = now
+
                 # Check for shell prompt at the end of output
-                last_lines = truncated_output.splitlines()[-3:] if truncated_output else []
-                for line in last_lines:
+                for line in lines:
                     for pat in prompt_patterns:
                         if pat.search(line.strip()):
                             PrintStyle.info(
                                 "Detected shell prompt, returning output early."
                             )
+                            truncated_output = output.get(self.agent)
+                            self.log.update(content=truncated_output)
                             return truncated_output
 
+            elif not shell.is_alive():
+                # the shell exited, no more output will come
+                truncated_output = output.get(self.agent)
+                self.log.update(content=truncated_output)
+                return truncated_output
+
             # Check for max execution time
             if now - start_time > max_exec_timeout:
                 sysinfo = self.agent.read_prompt(
                     "fw.code.max_time.md", timeout=max_exec_timeout
                 )
                 response = self.agent.read_prompt("fw.code.info.md", info=sysinfo)
+                truncated_output = output.get(self.agent)
                 if truncated_output:
                     response = truncated_output + "\n\n" + response
                 PrintStyle.warning(sysinfo)
@@ -266,6 +411,7 @@ class CodeExecution(Tool):
                         "fw.code.pause_time.md", timeout=between_output_timeout
                     )
                     response = self.agent.read_prompt("fw.code.info.md", info=sysinfo)
+                    truncated_output = output.get(self.agent)
                     if truncated_output:
                         response = truncated_output + "\n\n" + response
                     PrintStyle.warning(sysinfo)
@@ -290,3 +436,13 @@ class CodeExecution(Tool):
         )
         self.log.update(content=response)
         return response
+
+
+def _add_lines(lines: deque[str], text: str):
+    # keeps the ends of the last lines, so prompts are found without scanning the whole output
+    for i, part in enumerate(text.split("\n")):
+        if i:
+            lines.append("")
+        segments = part.split("\r")
+        line = segments[-1] if len(segments) > 1 else lines[-1] + part
+        lines[-1] = line[-PROMPT_LINE_LENGTH:]
@@ -11,7 +11,7 @@ from flask import Flask, request, Response
 from flask_basicauth import BasicAuth
 from python.helpers import errors, files, git
 from python.helpers.files import get_abs_path
-from python.helpers import persist_chat, runtime, dotenv, process
+from python.helpers import persist_chat, runtime, dotenv, process, loop_monitor
 from python.helpers.cloudflare_tunnel import CloudflareTunnel
 from python.helpers.extract_tools import load_classes_from_folder
 from python.helpers.api import ApiHandler
@@ -150,6 +150,7 @@ def run():
 
     PrintStyle().print("Starting job loop...")
     job_loop = DeferredTask().start_task(run_loop)
+    loop_monitor.start()
 
     PrintStyle().print("Starting server...")
     class NoRequestLoggingWSGIRequestHandler(WSGIRequestHandler):
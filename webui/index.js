@@ -338,9 +338,49 @@ function setConnectionStatus(connected) {
 let lastLogVersion = 0;
 let lastLogGuid = ""
 let lastSpokenNo = 0
+// full log items by no, long texts are polled as appended suffixes only
+let logItems = {}
+const LOG_DELTA_MIN_LENGTH = 1024
+// sidebar lists, the server only sends them when their version changed
+let lastContextsVersion = null
+let lastContexts = []
+let lastTasks = []
+
+function getLogLengths() {
+    const lengths = {}
+    for (const [no, log] of Object.entries(logItems)) {
+        const known = {}
+        if (log.heading && log.heading.length >= LOG_DELTA_MIN_LENGTH) known.heading = log.heading.length
+        if (log.content && log.content.length >= LOG_DELTA_MIN_LENGTH) known.content = log.content.length
+        for (const [key, value] of Object.entries(log.kvps || {})) {
+            if (typeof value === "string" && value.length >= LOG_DELTA_MIN_LENGTH) known["kvps." + key] = value.length
+        }
+        if (Object.keys(known).length) lengths[no] = known
+    }
+    return lengths
+}
+
+function applyLogDelta(log) {
+    const known = logItems[log.no]
+    if (log.appended) {
+        for (const key of log.appended) {
+            if (key.startsWith("kvps.")) {
+                const name = key.slice(5)
+                log.kvps[name] = ((known && known.kvps && known.kvps[name]) || "") + log.kvps[name]
+            } else {
+                log[key] = ((known && known[key]) || "") + log[key]
+            }
+        }
+        delete log.appended
+    }
+    logItems[log.no] = log
+    return log
+}
 
 async function poll() {
-    let updated = false
+    // the push stream delivers updates and tracks what this client has
+    if (isPollStreamOpen()) return false
+
     try {
         // Get timezone from navigator
         const timezone = Intl.DateTimeFormat().resolvedOptions().timeZone;
@@ -349,6 +389,9 @@ async function poll() {
             "/poll",
             {
                 log_from: lastLogVersion,
+                log_guid: lastLogGuid,
+                log_lengths: getLogLengths(),
+                contexts_version: lastContextsVersion,
                 context: context || null,
                 timezone: timezone
             }
@@ -360,17 +403,30 @@ async function poll() {
             return false;
         }
 
+        return applyPollResponse(response)
+    } catch (error) {
+        console.error('Error:', error);
+        setConnectionStatus(false)
+    }
+
+    return false
+}
+
+function applyPollResponse(response) {
+    let updated = false
+    try {
         if (!context) setContext(response.context)
         if (response.context != context) return //skip late polls after context change
 
         if (lastLogGuid != response.log_guid) {
             chatHistory.innerHTML = ""
             lastLogVersion = 0
+            logItems = {}
         }
 
         if (lastLogVersion != response.log_version) {
             updated = true
-            for (const log of response.logs) {
+            for (const log of response.logs.map(applyLogDelta)) {
                 const messageId = log.id || log.no; // Use log.id if available
                 setMessage(messageId, log.type, log.heading, log.content, log.temp, log.kvps);
             }
@@ -389,16 +445,26 @@ async function poll() {
         // Update status icon state
         setConnectionStatus(true)
 
+        // chat and task lists are only sent when they changed since lastContextsVersion
+        const listsChanged = response.contexts !== undefined
+        if (listsChanged) {
+            lastContexts = response.contexts || []
+            lastTasks = response.tasks || []
+        }
+        lastContextsVersion = response.contexts_version
+        response.contexts = lastContexts
+        response.tasks = lastTasks
+
         // Update chats list and sort by created_at time (newer first)
         const chatsAD = Alpine.$data(chatsSection);
-        const contexts = response.contexts || [];
-        chatsAD.contexts = contexts.sort((a, b) =>
+        const contexts = response.contexts;
+        if (listsChanged) chatsAD.contexts = contexts.sort((a, b) =>
             (b.created_at || 0) - (a.created_at || 0)
         );
 
         // Update tasks list and sort by creation time (newer first)
         const tasksSection = document.getElementById('tasks-section');
-        if (tasksSection) {
+        if (tasksSection && listsChanged) {
             const tasksAD = Alpine.$data(tasksSection);
             let tasks = response.tasks || [];
 
@@ -484,12 +550,58 @@ async function poll() {
 
     } catch (error) {
         console.error('Error:', error);
-        setConnectionStatus(false)
     }
 
     return updated
 }
 
+// server-sent events push the poll output on every change, timed polling is the fallback
+let pollStream = null
+let pollStreamContext = null
+let pollStreamRetryAt = 0
+const POLL_STREAM_RETRY_DELAY = 5000
+
+function isPollStreamOpen() {
+    return pollStream !== null && pollStreamContext == context
+}
+
+function openPollStream() {
+    closePollStream()
+    if (!window.EventSource || !context || Date.now() < pollStreamRetryAt) return
+
+    const params = new URLSearchParams({
+        context: context,
+        log_from: lastLogVersion,
+        log_guid: lastLogGuid,
+        timezone: Intl.DateTimeFormat().resolvedOptions().timeZone
+    })
+    const source = new EventSource("/poll_stream?" + params.toString())
+    const streamContext = context
+
+    source.onmessage = (event) => {
+        if (source !== pollStream || streamContext != context) return
+        applyPollResponse(JSON.parse(event.data))
+    }
+    // the context is gone on the server, poll once and reopen
+    source.addEventListener("close", () => {
+        if (source === pollStream) closePollStream()
+    })
+    source.onerror = () => {
+        if (source !== pollStream) return
+        closePollStream()
+        pollStreamRetryAt = Date.now() + POLL_STREAM_RETRY_DELAY
+    }
+
+    pollStream = source
+    pollStreamContext = streamContext
+}
+
+function closePollStream() {
+    if (pollStream) pollStream.close()
+    pollStream = null
+    pollStreamContext = null
+}
+
 function afterMessagesUpdate(logs) {
     if (localStorage.getItem('speech') == 'true') {
         speakMessages(logs)
@@ -681,11 +793,13 @@ window.selectChat = async function (id) {
 export const setContext = function (id) {
     if (id == context) return;
     context = id;
+    closePollStream();
     // Always reset the log tracking variables when switching contexts
     // This ensures we get fresh data from the backend
     lastLogGuid = "";
     lastLogVersion = 0;
     lastSpokenNo = 0;
+    logItems = {};
 
     // Clear the chat history immediately to avoid showing stale content
     chatHistory.innerHTML = "";
@@ -1069,7 +1183,14 @@ async function startPolling() {
         let nextInterval = longInterval
 
         try {
+            if (isPollStreamOpen()) {
+                setTimeout(_doPoll.bind(this), longInterval);
+                return
+            }
+            if (pollStream) closePollStream() // context changed
             const result = await poll();
+            // catch up by polling first, then continue from there with the stream
+            openPollStream()
             if (result) shortIntervalCount = shortIntervalPeriod; // Reset the counter when the result is true
             if (shortIntervalCount > 0) shortIntervalCount--; // Decrease the counter on each call
             nextInterval = shortIntervalCount > 0 ? shortInterval : longInterval;